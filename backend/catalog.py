@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import bisect
+import hashlib
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SORTS = ("catalog", "price_asc", "price_desc")
+
+
+def encode_cursor(sort: str, key: Tuple) -> str:
+    raw = json.dumps([sort, *key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    """Return the key a cursor resumes after; raises ValueError for malformed or mismatched cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, rank, item_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if cursor_sort != sort or not isinstance(rank, int) or not isinstance(item_id, str):
+        raise ValueError("Cursor does not belong to this sort order")
+    return rank, item_id
+
+
+class CatalogView:
+    """The items of one type (or all) in one sort order, with their keyset keys.
+
+    Keys are ``(rank, id)`` where rank is the catalog position, the price, or the
+    negated price, so every sort is ascending and ties break on id. They are kept
+    as a rank array plus an id list; ``positions`` index the snapshot's items.
+    """
+
+    def __init__(self, positions: np.ndarray, ranks: np.ndarray, id_order: np.ndarray, ids: List[str]):
+        order = np.lexsort((id_order[positions], ranks))
+        self.positions = positions[order]
+        self.ranks = ranks[order]
+        self.ids = [ids[position] for position in self.positions.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def key(self, index: int) -> Tuple[int, str]:
+        return int(self.ranks[index]), self.ids[index]
+
+    def rank_range(self, low: Optional[int], high: Optional[int]) -> Tuple[int, int]:
+        """Indexes of the first key with rank >= ``low`` and one past the last with rank <= ``high``; None is unbounded."""
+        # Integer bounds only: a float bound would make searchsorted convert the whole array
+        start = int(np.searchsorted(self.ranks, low, "left")) if low is not None else 0
+        end = int(np.searchsorted(self.ranks, high, "right")) if high is not None else len(self.ranks)
+        return start, end
+
+    def bisect_right(self, key: Tuple) -> int:
+        rank, item_id = key
+        low, high = self.rank_range(rank, rank)
+        return bisect.bisect_right(self.ids, item_id, low, high)
+
+
+class CatalogPage:
+    def __init__(self, items: List[dict], encoded: List[bytes], next_key: Optional[Tuple], total: int):
+        self.items = items
+        self.encoded = encoded
+        self.next_key = next_key
+        self.total = total
+
+    @property
+    def body(self) -> bytes:
+        # Items are serialized once per snapshot; a page only joins their bytes
+        return b"[" + b",".join(self.encoded) + b"]"
+
+
+class CatalogSnapshot:
+    """Immutable view of the item catalog with every item pre-serialized to JSON."""
+
+    def __init__(self, version: int, items: List[dict]):
+        self.version = version
+        self.items = items
+        self.by_id: Dict[str, dict] = {item["id"]: item for item in items}
+        self.id_to_name: Dict[str, str] = {item["id"]: item["item_name"] for item in items}
+        self.name_to_id: Dict[str, str] = {item["item_name"]: item["id"] for item in items}
+        self.encoded: List[bytes] = [json.dumps(item, separators=(",", ":")).encode("utf-8") for item in items]
+        digest = hashlib.sha256()
+        for encoded in self.encoded:
+            digest.update(encoded)
+            digest.update(b"\n")
+        self.etag = '"' + digest.hexdigest()[:32] + '"'
+        self.positions: Dict[str, int] = {item["id"]: position for position, item in enumerate(items)}
+        # Every view is built here, so requests never sort and unknown types cache nothing
+        ids = [item["id"] for item in items]
+        id_order = np.empty(len(ids), dtype=np.int64)
+        id_order[sorted(range(len(ids)), key=ids.__getitem__)] = np.arange(len(ids))
+        prices = np.array([item["coin_price"] for item in items], dtype=np.int64)
+        by_type: Dict[Optional[str], List[int]] = {None: list(range(len(items)))}
+        for position, item in enumerate(items):
+            by_type.setdefault(item["item_type"], []).append(position)
+        self._views: Dict[Tuple[Optional[str], str], CatalogView] = {}
+        for item_type, typed in by_type.items():
+            positions = np.array(typed, dtype=np.int64)
+            ranks = {"catalog": positions, "price_asc": prices[positions], "price_desc": -prices[positions]}
+            for sort in SORTS:
+                self._views[(item_type, sort)] = CatalogView(positions, ranks[sort], id_order, ids)
+
+    def view(self, item_type: Optional[str], sort: str) -> Optional[CatalogView]:
+        """Sorted view for one type (or all) and order; None when no item has that type."""
+        return self._views.get((item_type, sort))
+
+    def page(self, item_type: Optional[str] = None, min_price: Optional[int] = None, max_price: Optional[int] = None,
+             sort: str = "catalog", after: Optional[Tuple] = None, limit: int = 50) -> CatalogPage:
+        """One page of items matching the filters, resuming after the key ``after``.
+
+        Price bounds are a bisection on the price-ordered views, so pages cost
+        O(log n + limit). Catalog order has no such index, so it takes no price bounds.
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        if sort == "catalog" and (min_price is not None or max_price is not None):
+            raise ValueError("Price filters need sort=price_asc or sort=price_desc")
+        if (item_type, sort) not in self._views:
+            return CatalogPage([], [], None, 0)
+        first, last = self.view(item_type, "price_asc").rank_range(min_price, max_price)
+        total = max(last - first, 0)
+
+        view = self.view(item_type, sort)
+        if sort == "price_asc":
+            start, end = first, last
+        elif sort == "price_desc":
+            start, end = view.rank_range(
+                -max_price if max_price is not None else None, -min_price if min_price is not None else None
+            )
+        else:
+            start, end = 0, len(view)
+        if after is not None:
+            if sort == "catalog":
+                # Items may have moved since the cursor was issued; resume after the item itself
+                after = (self.positions.get(after[1], after[0]), after[1])
+            start = max(start, view.bisect_right(after))
+
+        stop = min(start + limit, end)
+        positions = view.positions[start:stop].tolist()
+        items = [self.items[position] for position in positions]
+        next_key = view.key(stop - 1) if items and stop < end else None
+        return CatalogPage(items, [self.encoded[position] for position in positions], next_key, total)
+
+    def page_etag(self, *params) -> str:
+        tag = hashlib.sha256(json.dumps([self.etag, *params]).encode("utf-8")).hexdigest()[:32]
+        return f'"{tag}"'
+
+    def matches(self, if_none_match: Optional[str], etag: Optional[str] = None) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        return (etag or self.etag) in [tag.strip() for tag in if_none_match.split(",")]
+
+
+class ItemCatalog:
+    """Versioned in-memory copy of the ``items`` collection.
+
+    ``load`` swaps in a fresh snapshot atomically, so readers always see one
+    consistent version. The version only moves forward when the content changes.
+    ``source_version`` is the storage fingerprint the snapshot was loaded at.
+    """
+
+    def __init__(self, normalize: Callable[[dict], dict] = dict):
+        self._normalize = normalize
+        self._lock = asyncio.Lock()
+        self.snapshot = CatalogSnapshot(0, [])
+        self.source_version: Any = None
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    async def load(self, documents: AsyncIterator[dict], source_version: Any = None) -> CatalogSnapshot:
+        # Loads run one at a time, so a slower, older load never replaces a newer one
+        async with self._lock:
+            documents = [doc async for doc in documents]
+            # Validating and indexing a large catalog takes seconds of CPU; keep it off the event loop
+            snapshot = await asyncio.to_thread(self._build, self.snapshot.version + 1, documents)
+            if snapshot.etag != self.snapshot.etag:
+                self.snapshot = snapshot
+            self.source_version = source_version
+            return self.snapshot
+
+    def _build(self, version: int, documents: List[dict]) -> CatalogSnapshot:
+        return CatalogSnapshot(version, [self._normalize(doc) for doc in documents])
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self.snapshot.by_id.get(item_id)
@@ -0,0 +1,179 @@
+import csv
+import json
+import logging
+import time
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+
+
+class ImportReport:
+    """Running totals of one import; ``errors`` keeps the first ``max_errors`` row errors."""
+
+    def __init__(self, max_errors: int = 1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.invalid = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.started = time.perf_counter()
+
+    def error(self, line: int, message: str):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def dict(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "invalid": self.invalid,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else None,
+            "errors": self.errors,
+            "errors_truncated": self.invalid + self.failed > len(self.errors),
+        }
+
+
+def check_item_id(item_id: str):
+    """Reject ids that cannot be a field name: inventories are updated with ``$inc`` on
+    ``inventory.<id>``, where a dot nests the counter and a leading ``$`` is an operator."""
+    if not item_id or "." in item_id or item_id.startswith("$"):
+        raise ValueError(f"id: must not be empty, contain '.', or start with '$' (got {item_id!r})")
+
+
+def describe_error(error: ValueError) -> str:
+    """One-line message for a row error; pydantic errors become ``field: message`` pairs."""
+    details = getattr(error, "errors", None)
+    if callable(details):
+        return "; ".join(f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in details())
+    return str(error)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Split a stream of byte chunks into decoded lines without holding more than one partial line."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+
+async def aiter_sync(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line.rstrip("\r\n")
+
+
+async def iter_documents(documents: Iterable[dict]) -> AsyncIterator[Tuple[int, dict]]:
+    """Feed already-parsed documents through the import pipeline, numbered from 1."""
+    for number, document in enumerate(documents, start=1):
+        yield number, document
+
+
+async def parse_rows(lines: AsyncIterable[str], fmt: str) -> AsyncIterator[Tuple[int, Union[dict, Exception]]]:
+    """Yield ``(line_number, row)``; rows that cannot be parsed are yielded as the exception.
+
+    CSV needs a header line and one record per line; empty cells are left out, so new
+    items get the model's defaults and existing items keep their stored values.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    header: Optional[List[str]] = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            if fmt == "ndjson":
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("Expected a JSON object")
+            else:
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                if len(values) != len(header):
+                    raise ValueError(f"Expected {len(header)} columns, found {len(values)}")
+                row = {name: value for name, value in zip(header, values) if value != ""}
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row
+
+
+async def import_items(rows: AsyncIterable[Tuple[int, Union[dict, Exception]]], storage,
+                       validate: Callable[[dict], dict], key: str = "item_name", chunk_size: int = 1000,
+                       report: Optional[ImportReport] = None,
+                       on_progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """Validate rows and upsert them by ``key`` in chunks of ``chunk_size``.
+
+    Only one chunk is held at a time, so memory stays flat whatever the input size.
+    Existing items are only updated with the fields a row supplies; the model's
+    defaults fill in the rest when the row inserts a new item. Within a chunk later
+    rows for a key override the fields of earlier ones. Existing items keep their
+    ``id`` (the inventories refer to it) unless the import is keyed by ``id`` itself.
+    """
+    report = report or ImportReport()
+    chunk: Dict[str, Tuple[int, dict, dict]] = {}
+
+    async def flush():
+        if not chunk:
+            return
+        lines = list(chunk.values())
+        chunk.clear()
+        result = await storage.upsert_items([(fields, defaults) for _, fields, defaults in lines], key)
+        report.inserted += result["inserted"]
+        report.updated += result["updated"]
+        report.unchanged += result["unchanged"]
+        for index, message in result["errors"]:
+            report.failed += 1
+            report.error(lines[index][0], message)
+        if on_progress is not None:
+            on_progress(report)
+
+    async for line, row in rows:
+        report.rows += 1
+        if isinstance(row, Exception):
+            report.invalid += 1
+            report.error(line, describe_error(row))
+            continue
+        if row.get(key) in (None, ""):
+            report.invalid += 1
+            report.error(line, f"Missing {key}")
+            continue
+        try:
+            item = validate(row)
+            check_item_id(item["id"])
+        except ValueError as e:
+            report.invalid += 1
+            report.error(line, describe_error(e))
+            continue
+        fields = {name: value for name, value in item.items() if name in row and (name != "id" or key == "id")}
+        defaults = {name: value for name, value in item.items() if name not in fields}
+        if item[key] in chunk:
+            fields = {**chunk.pop(item[key])[1], **fields}
+            defaults = {name: value for name, value in defaults.items() if name not in fields}
+        chunk[item[key]] = (line, fields, defaults)
+        if len(chunk) >= chunk_size:
+            await flush()
+    await flush()
+    logger.info(
+        "Imported %d rows: %d inserted, %d updated, %d unchanged, %d invalid, %d failed",
+        report.rows, report.inserted, report.updated, report.unchanged, report.invalid, report.failed,
+    )
+    return report
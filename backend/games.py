@@ -0,0 +1,145 @@
+import math
+import os
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+class AliasSampler:
+    """Walker/Vose alias table: draws an index from a discrete distribution in O(1)."""
+
+    def __init__(self, probabilities: List[float]):
+        n = len(probabilities)
+        scaled = np.asarray(probabilities, dtype=np.float64) * n
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1.0 up to rounding error
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        columns = rng.integers(0, len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[columns]
+        return np.where(keep, columns, self.alias[columns])
+
+
+class Game:
+    """A game of chance declared as a cost per play and a payout table.
+
+    ``payouts`` is a list of ``{"coins": int, "probability": float}`` entries whose
+    probabilities must sum to 1. ``message`` and ``batch_message`` are format strings
+    that receive ``coins_won`` and ``count``.
+    """
+
+    def __init__(self, slug: str, cost: int, payouts: List[dict], message: str, batch_message: str):
+        validate_payouts(slug, cost, payouts)
+        self.slug = slug
+        self.cost = cost
+        self.payouts = payouts
+        self.message = message
+        self.batch_message = batch_message
+        self.coins = np.array([payout["coins"] for payout in payouts], dtype=np.int64)
+        self.probabilities = np.array([payout["probability"] for payout in payouts], dtype=np.float64)
+        self.sampler: Optional[AliasSampler] = None
+
+    def compile(self):
+        self.sampler = AliasSampler(self.probabilities)
+
+    def draw(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        if self.sampler is None:
+            self.compile()
+        return self.coins[self.sampler.sample(rng, count)]
+
+    def expected_return(self) -> float:
+        return float(self.coins @ self.probabilities) / self.cost
+
+
+def validate_payouts(slug: str, cost: int, payouts: List[dict]):
+    if cost <= 0:
+        raise ValueError(f"Game {slug}: cost must be positive")
+    if not payouts:
+        raise ValueError(f"Game {slug}: payout table is empty")
+    for payout in payouts:
+        if payout["coins"] < 0:
+            raise ValueError(f"Game {slug}: payouts cannot be negative")
+        if not 0 <= payout["probability"] <= 1:
+            raise ValueError(f"Game {slug}: probabilities must be between 0 and 1")
+    total = math.fsum(payout["probability"] for payout in payouts)
+    if not math.isclose(total, 1.0, abs_tol=1e-9):
+        raise ValueError(f"Game {slug}: probabilities sum to {total}, expected 1")
+
+
+class GameRegistry:
+    def __init__(self):
+        self._games: Dict[str, Game] = {}
+
+    def register(self, game: Game) -> Game:
+        if game.slug in self._games:
+            raise ValueError(f"Game {game.slug} is already registered")
+        self._games[game.slug] = game
+        return game
+
+    def get(self, slug: str) -> Optional[Game]:
+        return self._games.get(slug)
+
+    def compile(self):
+        for game in self._games.values():
+            game.compile()
+
+    def __iter__(self) -> Iterator[Game]:
+        return iter(self._games.values())
+
+
+_rng: Optional[np.random.Generator] = None
+_rng_pid: Optional[int] = None
+
+def worker_rng() -> np.random.Generator:
+    """Return this process's RNG, creating an independent stream after every fork."""
+    global _rng, _rng_pid
+    if _rng is None or _rng_pid != os.getpid():
+        _rng = np.random.default_rng(np.random.SeedSequence(spawn_key=(os.getpid(),)))
+        _rng_pid = os.getpid()
+    return _rng
+
+
+game_registry = GameRegistry()
+
+game_registry.register(Game(
+    slug="lucky-spin",
+    cost=50,
+    payouts=[
+        {"coins": 10, "probability": 0.3},
+        {"coins": 25, "probability": 0.25},
+        {"coins": 50, "probability": 0.2},
+        {"coins": 100, "probability": 0.15},
+        {"coins": 200, "probability": 0.08},
+        {"coins": 500, "probability": 0.02},
+    ],
+    message="You won {coins_won} coins!",
+    batch_message="You spun {count} times and won {coins_won} coins!",
+))
+
+game_registry.register(Game(
+    slug="egg-smash",
+    cost=25,
+    payouts=[
+        {"coins": 5, "probability": 0.4},
+        {"coins": 15, "probability": 0.3},
+        {"coins": 30, "probability": 0.15},
+        {"coins": 50, "probability": 0.1},
+        {"coins": 100, "probability": 0.04},
+        {"coins": 200, "probability": 0.01},
+    ],
+    message="You smashed an egg and won {coins_won} coins!",
+    batch_message="You smashed {count} eggs and won {coins_won} coins!",
+))
@@ -0,0 +1,84 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class IndexSpec:
+    """A single index declaration: collection, key list and index options."""
+
+    def __init__(self, collection: str, keys: List[Tuple[str, int]], name: str, **options):
+        self.collection = collection
+        self.keys = keys
+        self.name = name
+        self.options = options
+
+    def describe(self) -> dict:
+        return {"collection": self.collection, "name": self.name, "keys": self.keys, **self.options}
+
+
+class IndexRegistry:
+    """Declarative list of the indexes the app relies on.
+
+    ``apply`` is idempotent: creating an index that already exists with the same
+    spec is a no-op in MongoDB, so it runs on every startup. Failures are recorded
+    per index instead of aborting startup, and ``status`` reports the outcome.
+    """
+
+    def __init__(self):
+        self.specs: List[IndexSpec] = []
+        self._status: Dict[str, dict] = {}
+
+    def register(self, collection: str, keys: List[Tuple[str, int]], name: Optional[str] = None, **options) -> IndexSpec:
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        spec = IndexSpec(collection, keys, name, **options)
+        self.specs.append(spec)
+        self._status[f"{collection}.{name}"] = {**spec.describe(), "state": "pending"}
+        return spec
+
+    async def apply(self, db) -> List[dict]:
+        for spec in self.specs:
+            key = f"{spec.collection}.{spec.name}"
+            try:
+                await db[spec.collection].create_index(spec.keys, name=spec.name, **spec.options)
+                self._status[key]["state"] = "ready"
+                self._status[key].pop("error", None)
+            except PyMongoError as e:
+                logger.error("Failed to build index %s: %s", key, e)
+                self._status[key]["state"] = "failed"
+                self._status[key]["error"] = str(e)
+        return self.status()
+
+    def skip(self, reason: str) -> List[dict]:
+        for entry in self._status.values():
+            entry["state"] = "skipped"
+            entry["error"] = reason
+        return self.status()
+
+    def status(self) -> List[dict]:
+        return list(self._status.values())
+
+
+index_registry = IndexRegistry()
+
+# Users
+index_registry.register("users", [("username", 1)], unique=True)
+index_registry.register("users", [("email", 1)], unique=True)
+index_registry.register("users", [("id", 1)], unique=True)
+index_registry.register("users", [("coins", -1), ("username", 1)])
+
+# Items
+index_registry.register("items", [("id", 1)], unique=True)
+index_registry.register("items", [("item_name", 1)], unique=True)
+index_registry.register("items", [("item_type", 1), ("coin_price", 1)])
+
+# Ledger
+index_registry.register("ledger", [("user_id", 1), ("created_at", -1)])
+
+# Refresh-token sessions; MongoDB deletes each one once expires_at has passed
+index_registry.register("sessions", [("token_hash", 1)], unique=True)
+index_registry.register("sessions", [("family_id", 1)])
+index_registry.register("sessions", [("user_id", 1)])
+index_registry.register("sessions", [("expires_at", 1)], expireAfterSeconds=0)
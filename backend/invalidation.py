@@ -0,0 +1,187 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from storage import ChangeStreamUnavailable, ResumeTokenInvalid
+
+logger = logging.getLogger(__name__)
+
+RESYNC = "resync"
+
+
+class ChangeEvent:
+    """One change to a watched collection, as delivered to in-process caches.
+
+    ``operation`` is ``insert``, ``update``, ``replace``, ``delete`` or ``resync``.
+    ``document`` is the document as it is now (None for deletes, or when it was
+    deleted before the change could be looked up). A ``resync`` event carries no
+    document and means anything in the collection may have changed, so subscribers
+    should drop or reload everything they hold for it.
+    """
+
+    __slots__ = ("collection", "operation", "document_id", "document")
+
+    def __init__(self, collection: str, operation: str, document_id: Any = None, document: Optional[dict] = None):
+        self.collection = collection
+        self.operation = operation
+        self.document_id = document_id
+        self.document = document
+
+    @classmethod
+    def from_change(cls, change: dict) -> "ChangeEvent":
+        return cls(
+            change["ns"]["coll"],
+            change["operationType"],
+            change.get("documentKey", {}).get("_id"),
+            change.get("fullDocument"),
+        )
+
+    def __repr__(self) -> str:
+        return f"ChangeEvent({self.collection!r}, {self.operation!r}, {self.document_id!r})"
+
+
+Handler = Callable[[ChangeEvent], Any]
+
+
+class InvalidationBus:
+    """Tails change streams on ``collections`` and fans the changes out to subscribers.
+
+    Every worker runs its own bus, so a write handled by one worker reaches the caches
+    of all the others. The last seen resume token is checkpointed to storage every
+    ``checkpoint_interval`` seconds and on stop, and the stream resumes from it after
+    a restart or a dropped connection. If the stored token is no longer resumable
+    the stream starts over and subscribers get a ``resync``.
+
+    When change streams are unavailable (standalone mongod, memory storage) the bus
+    falls back to TTL expiry: caches keep relying on their own TTLs, and every
+    ``fallback_interval`` subscribers get a ``resync`` so state without a TTL (the
+    catalog, the leaderboard) is refreshed too. The stream is retried at the same
+    interval.
+    """
+
+    def __init__(self, storage, collections: Sequence[str] = ("users", "items"), name: str = "default",
+                 fallback_interval: float = 30.0, retry_interval: float = 5.0, checkpoint_interval: float = 1.0):
+        self.storage = storage
+        self.collections = tuple(collections)
+        self.name = name
+        self.fallback_interval = fallback_interval
+        self.retry_interval = retry_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.mode = "stopped"
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._token: Optional[Any] = None
+        self._saved_token: Optional[Any] = None
+        self._last_checkpoint = 0.0
+        # Metrics
+        self.events: Dict[Tuple[str, str], int] = {}
+        self.handler_errors = 0
+        self.stream_errors = 0
+
+    def subscribe(self, collection: str, handler: Handler):
+        """Call ``handler(event)`` (a function or coroutine function) for every change to ``collection``."""
+        if collection not in self.collections:
+            raise ValueError(f"Collection {collection} is not watched")
+        self._handlers.setdefault(collection, []).append(handler)
+
+    def start(self):
+        if self._task is None:
+            self.mode = "starting"
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._checkpoint(force=True)
+        self.mode = "stopped"
+
+    async def dispatch(self, event: ChangeEvent):
+        key = (event.collection, event.operation)
+        self.events[key] = self.events.get(key, 0) + 1
+        for handler in self._handlers.get(event.collection, ()):
+            try:
+                result = handler(event)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                self.handler_errors += 1
+                logger.exception("Invalidation handler failed for %r", event)
+
+    async def resync(self):
+        for collection in self.collections:
+            await self.dispatch(ChangeEvent(collection, RESYNC))
+
+    async def _checkpoint(self, force: bool = False):
+        if self._token is None or self._token == self._saved_token:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        self._last_checkpoint = now
+        try:
+            await self.storage.save_resume_token(self.name, self._token)
+            self._saved_token = self._token
+        except Exception:
+            logger.exception("Could not save change stream resume token")
+
+    async def _consume(self):
+        # Without a resume point we cannot know what changed before the stream opened
+        needs_resync = self._token is None
+        async for token, change in self.storage.watch_changes(self.collections, self._token):
+            if self.mode != "streaming":
+                logger.info("Change stream open on %s", ", ".join(self.collections))
+                self.mode = "streaming"
+            if needs_resync:
+                needs_resync = False
+                await self.resync()
+            if change is not None:
+                await self.dispatch(ChangeEvent.from_change(change))
+            if token is not None:
+                self._token = token
+            await self._checkpoint()
+
+    async def _run(self):
+        try:
+            self._token = self._saved_token = await self.storage.load_resume_token(self.name)
+        except Exception:
+            logger.exception("Could not load change stream resume token")
+        while True:
+            try:
+                await self._consume()
+            except ChangeStreamUnavailable as e:
+                if self.mode != "ttl":
+                    logger.warning("Change streams unavailable, falling back to TTL expiry: %s", e)
+                self.mode = "ttl"
+                self._token = None
+            except ResumeTokenInvalid as e:
+                logger.warning("Cannot resume change stream, starting over: %s", e)
+                self._token = None
+                continue
+            except Exception:
+                self.stream_errors += 1
+                logger.exception("Change stream failed")
+                if self.mode == "streaming":
+                    self.mode = "reconnecting"
+
+            if self.mode == "ttl":
+                await asyncio.sleep(self.fallback_interval)
+                await self.resync()
+            else:
+                await asyncio.sleep(self.retry_interval)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "collections": list(self.collections),
+            "events": {f"{collection}.{operation}": count for (collection, operation), count in self.events.items()},
+            "handler_errors": self.handler_errors,
+            "stream_errors": self.stream_errors,
+            "resumable": self._token is not None,
+        }
@@ -0,0 +1,57 @@
+import logging
+from typing import Dict, List, Mapping
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+def count_inventory(names: List[str], name_to_id: Mapping[str, str]) -> Dict[str, int]:
+    """Convert a legacy list of item names into an ``{item_id: quantity}`` map.
+
+    Names that are no longer in the catalog keep the name itself as their key so
+    nothing a player owns is dropped.
+    """
+    counts: Dict[str, int] = {}
+    for name in names:
+        key = name_to_id.get(name, name)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def expand_inventory(counts: Mapping[str, int], id_to_name: Mapping[str, str]) -> List[str]:
+    """Inverse of ``count_inventory``: the list of item names the API has always returned."""
+    names: List[str] = []
+    for key, quantity in counts.items():
+        names.extend([id_to_name.get(key, key)] * quantity)
+    return names
+
+async def migrate_user_inventory(collection, user: dict, name_to_id: Mapping[str, str]) -> dict:
+    """Migrate a single user document in place, guarded so a concurrent writer wins."""
+    if isinstance(user.get("inventory"), list):
+        counts = count_inventory(user["inventory"], name_to_id)
+        await collection.update_one(
+            {"_id": user["_id"], "inventory": user["inventory"]},
+            {"$set": {"inventory": counts}},
+        )
+        user = {**user, "inventory": counts}
+    return user
+
+async def migrate_inventories(collection, name_to_id: Mapping[str, str], batch_size: int = 500) -> int:
+    """Rewrite every user whose inventory is still a list, in batches of ``batch_size``."""
+    migrated = 0
+    batch = []
+    cursor = collection.find({"inventory": {"$type": "array"}}, {"_id": 1, "inventory": 1})
+    async for user in cursor:
+        batch.append(UpdateOne(
+            {"_id": user["_id"], "inventory": user["inventory"]},
+            {"$set": {"inventory": count_inventory(user["inventory"], name_to_id)}},
+        ))
+        if len(batch) >= batch_size:
+            result = await collection.bulk_write(batch, ordered=False)
+            migrated += result.modified_count
+            batch = []
+    if batch:
+        result = await collection.bulk_write(batch, ordered=False)
+        migrated += result.modified_count
+    logger.info("Migrated %d user inventories to counted form", migrated)
+    return migrated
@@ -0,0 +1,68 @@
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+
+class Leaderboard:
+    """Top-``capacity`` players by coins, kept sorted in memory.
+
+    Seeded once from storage, then updated with every balance change the process
+    makes. Entries are ``(-coins, username)`` so the list sorts richest first with
+    ties broken by username. A player who drops below the last tracked entry while
+    the board is full is removed, since someone outside the board may now outrank
+    them; ``needs_refill`` tells the caller when enough such removals have happened
+    that the board should be reseeded.
+    """
+
+    def __init__(self, capacity: int = 1000, refill_below: Optional[int] = None):
+        self.capacity = capacity
+        self.refill_below = refill_below if refill_below is not None else capacity // 2
+        self._entries: List[Tuple[int, str]] = []
+        self._coins: Dict[str, int] = {}
+        # Whether the board ever held every player; if so, nobody outside it can outrank anyone inside
+        self._complete = True
+
+    def seed(self, users: List[dict], complete: bool):
+        self._entries = sorted((-user["coins"], user["username"]) for user in users[:self.capacity])
+        self._coins = {username: -coins for coins, username in self._entries}
+        self._complete = complete
+
+    def _remove(self, username: str):
+        coins = self._coins.pop(username, None)
+        if coins is not None:
+            index = bisect.bisect_left(self._entries, (-coins, username))
+            del self._entries[index]
+
+    def update(self, username: str, coins: int):
+        self._remove(username)
+        entry = (-coins, username)
+        if len(self._entries) >= self.capacity:
+            if entry >= self._entries[-1]:
+                # Below the cutoff: we can no longer place this player
+                self._complete = False
+                return
+            _, evicted = self._entries.pop()
+            del self._coins[evicted]
+            self._complete = False
+        elif not self._complete and self._entries and entry > self._entries[-1]:
+            # Players outside the board may sit between the cutoff and this score
+            return
+        bisect.insort(self._entries, entry)
+        self._coins[username] = coins
+
+    def top(self, limit: int) -> List[dict]:
+        return [
+            {"rank": rank, "username": username, "coins": -coins}
+            for rank, (coins, username) in enumerate(self._entries[:limit], start=1)
+        ]
+
+    def rank(self, username: str) -> Optional[int]:
+        coins = self._coins.get(username)
+        if coins is None:
+            return None
+        return bisect.bisect_left(self._entries, (-coins, username)) + 1
+
+    def needs_refill(self) -> bool:
+        return not self._complete and len(self._entries) < self.refill_below
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LedgerWriter:
+    """Write-behind queue for the append-only ``ledger`` collection.
+
+    Handlers call ``record`` which only enqueues; a background task hands the queue to
+    ``write_batch`` (one unordered ``bulk_write`` on Mongo) whenever ``batch_size`` entries are waiting or
+    ``flush_interval`` seconds have passed. When the queue is full ``record`` waits,
+    which pushes back on the request instead of growing memory without bound.
+    Failed batches are retried as a whole, so ``write_batch`` must skip entries whose
+    ``id`` it already stored (a timed-out write may still have been applied).
+    """
+
+    def __init__(self, write_batch: Callable[[List[dict]], Awaitable[None]], batch_size: int = 500, flush_interval: float = 0.5,
+                 max_queue: int = 10000, max_retries: int = 3):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.last_lag_seconds = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def record(self, user_id: str, username: str, kind: str, ref: str, delta: int,
+                     balance: int, plays: int = 1):
+        entry = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "username": username,
+            "kind": kind,
+            "ref": ref,
+            "delta": delta,
+            "balance": balance,
+            "plays": plays,
+            "created_at": datetime.utcnow(),
+        }
+        await self._queue.put((time.monotonic(), entry))
+        self.enqueued += 1
+
+    async def _next_batch(self) -> List[tuple]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[tuple]):
+        started = time.monotonic()
+        entries = [entry for _, entry in batch]
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await self.write_batch(entries)
+                break
+            except Exception as e:
+                logger.warning("Ledger flush of %d entries failed (attempt %d): %s", len(batch), attempt, e)
+                if attempt == self.max_retries:
+                    self.dropped += len(batch)
+                    logger.error("Dropping %d ledger entries after %d attempts", len(batch), attempt)
+                    return
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        finished = time.monotonic()
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_seconds = finished - started
+        self.last_lag_seconds = finished - batch[0][0]
+        self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+
+    async def _run(self):
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+
+    async def drain(self):
+        """Let the flusher write out everything still queued, then stop it."""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        oldest = None
+        if not self._queue.empty():
+            oldest = time.monotonic() - self._queue._queue[0][0]
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "oldest_pending_seconds": oldest or 0.0,
+        }
@@ -0,0 +1,291 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, *labels: str, value: float):
+        """Mirror a total that another component already keeps."""
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, *labels: str, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # one slot per bucket plus +Inf, then sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format.
+
+    ``collectors`` are called on every scrape to refresh gauges that mirror state
+    owned by other components (pools, caches, queues).
+    """
+
+    def __init__(self, prefix: str = "gamehub"):
+        self.prefix = prefix
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def _add(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(f"{self.prefix}_{name}", documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(f"{self.prefix}_{name}", documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(f"{self.prefix}_{name}", documentation, labels, buckets))
+
+    def collector(self, func: Callable[[], None]) -> Callable[[], None]:
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter("http_requests_total", "HTTP requests by route, method and status", ["route", "method", "status"])
+http_latency = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route", ["route", "method"])
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests currently being served", ["route"])
+storage_latency = metrics.histogram("storage_operation_duration_seconds", "Storage call latency as seen by the event loop", ["operation"])
+request_storage_time = metrics.histogram("http_request_storage_seconds", "Time each request spent awaiting storage", ["route"])
+mongo_commands = metrics.histogram("mongo_command_duration_seconds", "MongoDB command latency by collection and command", ["collection", "command"])
+mongo_failures = metrics.counter("mongo_command_failures_total", "Failed MongoDB commands by collection and command", ["collection", "command"])
+mongo_checkout_wait = metrics.histogram("mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection")
+mongo_checkout_failures = metrics.counter("mongo_pool_checkout_failures_total", "Failed MongoDB connection checkouts", ["reason"])
+
+# Per-request accumulator for storage time; set by the middleware, filled by instrument_storage
+_storage_time: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("storage_time", default=None)
+
+
+def current_storage_seconds() -> float:
+    accumulator = _storage_time.get()
+    return accumulator[0] if accumulator else 0.0
+
+
+def route_template(scope) -> str:
+    """Path template of the route that will handle ``scope``, e.g. ``/api/games/lucky-spin``."""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status counts and in-flight requests.
+
+    Routes are labelled with their path template (``/api/games/lucky-spin``), never the raw
+    path, so label cardinality stays fixed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        accumulator = [0.0]
+        token = _storage_time.set(accumulator)
+        started = time.perf_counter()
+        route_name = route_template(scope)
+        http_in_flight.inc(route_name)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.inc(route_name, amount=-1)
+            http_requests.inc(route_name, scope["method"], str(status["code"]))
+            http_latency.observe(route_name, scope["method"], value=elapsed)
+            request_storage_time.observe(route_name, value=accumulator[0])
+            _storage_time.reset(token)
+
+
+def instrument_storage(storage):
+    """Wrap every public coroutine method of ``storage`` so its latency is recorded."""
+    for operation in dir(storage):
+        method = getattr(storage, operation)
+        if operation.startswith("_") or not inspect.iscoroutinefunction(method):
+            continue
+
+        def wrap(method=method, operation=operation):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    storage_latency.observe(operation, value=elapsed)
+                    accumulator = _storage_time.get()
+                    if accumulator is not None:
+                        accumulator[0] += elapsed
+            return timed
+
+        setattr(storage, operation, wrap())
+    return storage
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command, labelled by collection and command name."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, object], Tuple[str, str]] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.database_name
+        self._pending[(event.request_id, event.connection_id)] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels is not None:
+            mongo_commands.observe(*labels, value=event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self._pending.pop((event.request_id, event.connection_id), None)
+        if labels is not None:
+            mongo_commands.observe(*labels, value=event.duration_micros / 1e6)
+            mongo_failures.inc(*labels)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Measures how long operations wait to check a connection out of the pool.
+
+    Motor runs PyMongo on executor threads and a checkout starts and completes on the
+    same thread, so the start time is keyed by (address, thread). ``current_wait_seconds``
+    is an exponentially weighted average that also decays while no checkouts happen,
+    so a burst of waits does not look permanent once traffic stops.
+    """
+
+    def __init__(self, decay_seconds: float = 5.0):
+        self._started: Dict[Tuple[object, int], float] = {}
+        self.decay_seconds = decay_seconds
+        self.last_wait_seconds = 0.0
+        self._ewma = 0.0
+        self._ewma_updated = time.monotonic()
+
+    def current_wait_seconds(self) -> float:
+        return self._ewma * math.exp(-(time.monotonic() - self._ewma_updated) / self.decay_seconds)
+
+    def connection_check_out_started(self, event):
+        self._started[(event.address, threading.get_ident())] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = self._started.pop((event.address, threading.get_ident()), None)
+        if started is not None:
+            self.last_wait_seconds = time.perf_counter() - started
+            mongo_checkout_wait.observe(value=self.last_wait_seconds)
+            self._ewma = 0.8 * self.current_wait_seconds() + 0.2 * self.last_wait_seconds
+            self._ewma_updated = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        self._started.pop((event.address, threading.get_ident()), None)
+        mongo_checkout_failures.inc(str(event.reason))
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+import bcrypt
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    # One job per batch keeps pickling and IPC small next to the bcrypt work
+    return [hash_password(password) for password in passwords]
+
+
+class PasswordPoolSaturated(Exception):
+    """Raised when the password pool already holds its maximum number of pending jobs."""
+
+
+class PasswordPool:
+    """Runs bcrypt work on a bounded thread or process pool instead of the event loop.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more may wait
+    for a free slot; anything beyond that is rejected with ``PasswordPoolSaturated``
+    so the caller can answer 503 instead of letting the backlog grow. Bulk callers
+    pass ``wait=True`` to queue for a slot instead.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue: int = 64,
+                 on_complete: Optional[Callable[[float, float], None]] = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password pool kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Called with (wait_seconds, run_seconds) after every job
+        self.on_complete = on_complete
+        self._executor: Executor = None
+        self._slots = asyncio.Semaphore(max_workers)
+        self._pending = 0
+        self._running = 0
+        # Metrics
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Forking a process that already runs threads (motor, the ledger) can deadlock the child
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, wait: bool = False) -> Any:
+        if not wait and self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordPoolSaturated()
+
+        self._pending += 1
+        enqueued = time.perf_counter()
+        try:
+            async with self._slots:
+                started = time.perf_counter()
+                waited = started - enqueued
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+                self._running += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._get_executor(), func, *args)
+                finally:
+                    ran = time.perf_counter() - started
+                    self._running -= 1
+                    self.completed += 1
+                    self.run_seconds_total += ran
+                    if self.on_complete is not None:
+                        self.on_complete(waited, ran)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self.run(verify_password, password, hashed)
+
+    async def hash_many(self, passwords: List[str], batch_size: int = 16) -> List[str]:
+        """Hash ``passwords`` in batches spread over every worker, keeping at most one batch per worker in flight.
+
+        Batches wait for a free slot rather than being rejected, so concurrent bulk
+        jobs on the same pool queue behind each other.
+        """
+        slots = asyncio.Semaphore(self.max_workers)
+
+        async def hash_batch(batch: List[str]) -> List[str]:
+            async with slots:
+                return await self.run(hash_passwords, batch, wait=True)
+
+        batches = [passwords[i:i + batch_size] for i in range(0, len(passwords), batch_size)]
+        results = await asyncio.gather(*(hash_batch(batch) for batch in batches))
+        return [hashed for batch in results for hashed in batch]
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "queued": self._pending - self._running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+            "wait_seconds_avg": self.wait_seconds_total / self.completed if self.completed else 0.0,
+            "run_seconds_total": self.run_seconds_total,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
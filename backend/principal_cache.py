@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a time-to-live."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class PrincipalCache:
+    """Caches decoded access tokens (token -> username) and user documents (username -> user).
+
+    Any handler that changes a user must call ``invalidate_user`` so no request is served
+    the pre-write document, passing the written state when it has it so the next request
+    for that user does not need a database read.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0):
+        self.tokens = TTLCache(maxsize, ttl)
+        self.users = TTLCache(maxsize, ttl)
+
+    def get_username(self, token: str) -> Optional[str]:
+        return self.tokens.get(token)
+
+    def put_token(self, token: str, username: str, expires_at: Optional[float] = None):
+        # Never keep a token around longer than the JWT itself is valid
+        ttl = None if expires_at is None else max(expires_at - time.time(), 0)
+        self.tokens.set(token, username, ttl)
+
+    def get_user(self, username: str) -> Optional[Any]:
+        return self.users.get(username)
+
+    def put_user(self, username: str, user: Any):
+        self.users.set(username, user)
+
+    def invalidate_user(self, username: str, updated_user: Optional[Any] = None):
+        """Drop the cached user; if the caller just wrote ``updated_user`` keep that instead."""
+        self.users.pop(username)
+        if updated_user is not None:
+            self.users.set(username, updated_user)
+
+    def clear(self):
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self) -> dict:
+        return {"tokens": self.tokens.stats(), "users": self.users.stats()}
@@ -0,0 +1,102 @@
+import cProfile
+import heapq
+import itertools
+import marshal
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from metrics import route_template
+
+
+class ProfileStore:
+    """Keeps the ``max_per_route`` slowest request profiles for every route."""
+
+    def __init__(self, max_per_route: int = 5):
+        self.max_per_route = max_per_route
+        self._heaps: Dict[str, list] = {}
+        self._by_id: Dict[str, dict] = {}
+        self._counter = itertools.count()
+
+    def add(self, route: str, method: str, duration: float, profile: cProfile.Profile):
+        heap = self._heaps.setdefault(route, [])
+        if len(heap) >= self.max_per_route and duration <= heap[0][0]:
+            return
+        profile.create_stats()
+        entry = {
+            "id": uuid.uuid4().hex,
+            "route": route,
+            "method": method,
+            "duration_ms": round(duration * 1000, 3),
+            "created_at": datetime.utcnow().isoformat(),
+            # Same layout pstats.Stats reads from a file written by dump_stats
+            "stats": marshal.dumps(profile.stats),
+        }
+        item = (duration, next(self._counter), entry)
+        if len(heap) >= self.max_per_route:
+            _, _, evicted = heapq.heapreplace(heap, item)
+            self._by_id.pop(evicted["id"], None)
+        else:
+            heapq.heappush(heap, item)
+        self._by_id[entry["id"]] = entry
+
+    def list(self) -> List[dict]:
+        entries = [{k: v for k, v in entry.items() if k != "stats"} for entry in self._by_id.values()]
+        return sorted(entries, key=lambda entry: (entry["route"], -entry["duration_ms"]))
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        return self._by_id.get(profile_id)
+
+    def clear(self):
+        self._heaps.clear()
+        self._by_id.clear()
+
+
+class ProfilerMiddleware:
+    """Opt-in cProfile capture for individual API requests.
+
+    A request is profiled when profiling is enabled and it either sends the trigger
+    header or is picked by ``sample_rate``. Only one request is profiled at a time:
+    cProfile observes the whole thread, so overlapping captures would mix requests.
+    Other tasks that run while the profiled request awaits I/O still show up in its
+    profile, which is why the slowest few per route are kept rather than averages.
+    """
+
+    def __init__(self, app, store: ProfileStore, enabled: bool = False, sample_rate: float = 0.0,
+                 header: str = "x-profile", path_prefix: str = "/api", exclude_prefix: str = "/api/admin"):
+        self.app = app
+        self.store = store
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.path_prefix = path_prefix
+        self.exclude_prefix = exclude_prefix
+        self._active = False
+
+    def _wanted(self, scope) -> bool:
+        if not self.enabled or self._active or scope["type"] != "http":
+            return False
+        path = scope["path"]
+        if not path.startswith(self.path_prefix) or path.startswith(self.exclude_prefix):
+            return False
+        for name, value in scope["headers"]:
+            if name == self.header:
+                return value not in (b"", b"0", b"false")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        self._active = True
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.disable()
+            self._active = False
+            self.store.add(route_template(scope), scope["method"], time.perf_counter() - started, profile)
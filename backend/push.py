@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+
+def format_sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class PushHub:
+    """Per-user fan-out of balance events to open server-sent event streams.
+
+    Each stream gets its own bounded queue. A stream that cannot keep up loses its
+    oldest events rather than blocking the handler that publishes; every event carries
+    absolute values (balance, inventory), so a client that misses one still converges
+    on the next.
+    """
+
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((event, data))
+            self.published += 1
+
+    def disconnect(self, user_id: str):
+        """End every open stream of ``user_id``, e.g. once its sessions are revoked."""
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def subscribed(self, user_id: str) -> bool:
+        return user_id in self._subscribers
+
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def stream(
+        self, user_id: str, snapshot: dict, heartbeat: float = 15.0, expires_at: Optional[float] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield SSE frames for ``user_id``: a snapshot first, then events, with comment heartbeats.
+
+        The stream ends at ``expires_at`` (epoch seconds, the access token's ``exp``) so it
+        never outlives the credentials it was opened with; the client reconnects with a
+        fresh token.
+        """
+        queue = self.subscribe(user_id)
+        try:
+            yield format_sse("snapshot", snapshot)
+            while True:
+                timeout = heartbeat
+                if expires_at is not None:
+                    remaining = expires_at - time.time()
+                    if remaining <= 0:
+                        return
+                    timeout = min(timeout, remaining)
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if expires_at is None or time.time() < expires_at:
+                        yield b": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield format_sse(*message)
+        finally:
+            self.unsubscribe(user_id, queue)
@@ -0,0 +1,62 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimitRule:
+    """``rate`` tokens per second refill a bucket holding at most ``burst`` tokens."""
+
+    def __init__(self, rate: float, burst: float):
+        if rate <= 0 or burst < 1:
+            raise ValueError("Rate limits need rate > 0 and burst >= 1")
+        self.rate = rate
+        self.burst = burst
+
+    @classmethod
+    def from_dict(cls, data: dict, default: "RateLimitRule") -> "RateLimitRule":
+        return cls(float(data.get("rate", default.rate)), float(data.get("burst", default.burst)))
+
+
+class RateLimiter:
+    """In-memory token buckets keyed by an arbitrary key (user, IP, ...).
+
+    Buckets are kept in LRU order and capped at ``max_keys`` so a flood of distinct
+    keys cannot grow memory without bound; an evicted key simply starts full again.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def acquire(self, key: Hashable, rule: RateLimitRule, cost: float = 1.0) -> Optional[float]:
+        """Take ``cost`` tokens; returns None on success or the seconds to wait before retrying."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rule.burst, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(rule.burst, bucket.tokens + (now - bucket.updated) * rule.rate)
+            bucket.updated = now
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return None
+        return (cost - bucket.tokens) / rule.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def retry_after_header(wait_seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(wait_seconds)))}
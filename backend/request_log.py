@@ -0,0 +1,192 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from metrics import current_storage_seconds, route_template
+
+# Per-request state: {"request_id": str, "user": Optional[str]}
+_request: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("request", default=None)
+
+# Query parameters that carry credentials (EventSource sends the access token as ?token=)
+SECRET_QUERY_PARAMS = re.compile(r"((?:^|[?&])(?:token|access_token)=)[^&\s\"]*")
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s'
+
+
+def current_request_id() -> Optional[str]:
+    request = _request.get()
+    return request["request_id"] if request is not None else None
+
+
+def set_request_user(username: str):
+    """Attach the authenticated user to the current request's log line."""
+    request = _request.get()
+    if request is not None:
+        request["user"] = username
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the correlation ID of the request that logged them.
+
+    Runs in the thread that logs, before the record crosses the queue, because the
+    listener thread cannot see the request's context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id() or "-"
+        return True
+
+
+class RedactQueryTokens(logging.Filter):
+    """Masks credential query parameters in access log lines, which include the query string."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                SECRET_QUERY_PARAMS.sub(r"\1[redacted]", arg) if isinstance(arg, str) else arg
+                for arg in record.args
+            )
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.addFilter(RequestIdFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now; args and exc_info may not outlive the caller
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; structured fields passed as ``extra={"fields": {...}}`` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        text = super().format(record)
+        fields = getattr(record, "fields", None)
+        return f"{text} {json.dumps(fields, default=str)}" if fields else text
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json", queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """Route all logging through a bounded queue drained by a background listener thread.
+
+    Handlers that do I/O only ever run on the listener thread, so logging from the
+    event loop costs a format-free enqueue. Returns the started listener; stop it on
+    shutdown to flush what is still queued.
+    """
+    if fmt not in ("json", "text"):
+        raise ValueError(f"Unknown log format: {fmt}")
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    # uvicorn's access log prints the full request target, ?token= included
+    logging.getLogger("uvicorn.access").addFilter(RedactQueryTokens())
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class RequestLogMiddleware:
+    """Gives every HTTP request a correlation ID and logs one structured line when it ends.
+
+    The ID comes from the ``x-request-id`` header when the client sends one and is echoed
+    back on the response. A ``sample_rate`` share of requests is logged; server errors and
+    requests slower than ``slow_seconds`` are always logged. Must sit inside
+    ``MetricsMiddleware`` so the request's storage time is available.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0, slow_seconds: float = 1.0, logger_name: str = "request"):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.logger = logging.getLogger(logger_name)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request = {"request_id": request_id or uuid.uuid4().hex, "user": None}
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request["request_id"].encode("latin-1"))]
+            await send(message)
+
+        token = _request.set(request)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            if status["code"] >= 500 or elapsed >= self.slow_seconds or random.random() < self.sample_rate:
+                self.logger.info("request", extra={"fields": {
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "user": request["user"],
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "db_ms": round(current_storage_seconds() * 1000, 3),
+                }})
+            _request.reset(token)
@@ -1,31 +1,144 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.responses import StreamingResponse
 import os
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
+import asyncio
 from datetime import datetime, timedelta
 import jwt
-import bcrypt
-import random
+import numpy as np
+
+from password_pool import PasswordPool, PasswordPoolSaturated, hash_password, verify_password
+from principal_cache import PrincipalCache
+from catalog import SORTS, ItemCatalog, decode_cursor, encode_cursor
+from catalog_import import FORMATS, import_items, iter_documents, iter_lines, parse_rows
+from user_import import provision_users
+from indexes import index_registry
+from games import Game, game_registry, worker_rng
+from inventory import expand_inventory
+from ledger import LedgerWriter
+from storage import DuplicateError, create_storage
+from metrics import MetricsMiddleware, MongoCommandListener, MongoPoolListener, instrument_storage, metrics
+from profiler import ProfilerMiddleware, ProfileStore
+from leaderboard import Leaderboard
+from rate_limit import RateLimiter, RateLimitRule, retry_after_header
+from push import PushHub
+from invalidation import RESYNC, ChangeEvent, InvalidationBus
+from request_log import RequestLogMiddleware, configure_logging, set_request_user
+from sessions import SessionInvalid, SessionManager
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Storage backend (STORAGE_BACKEND=mongo|memory), instrumented for /metrics
+mongo_pool_listener = MongoPoolListener()
+storage = instrument_storage(
+    create_storage(os.environ, event_listeners=[MongoCommandListener(), mongo_pool_listener])
+)
 
 # JWT Settings
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', '30'))
+
+# Rotating refresh tokens, so clients renew access tokens without sending the password again
+session_manager = SessionManager(
+    storage, lifetime=timedelta(days=float(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', '30')))
+)
+
+# Comma-separated usernames allowed to call /api/admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
+
+# Request profiling
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+profile_store = ProfileStore(max_per_route=int(os.environ.get('PROFILE_KEEP_PER_ROUTE', '5')))
+
+# Games
+GAME_MAX_BATCH = int(os.environ.get('GAME_MAX_BATCH', '100'))
+
+# Rate limiting and load shedding for game endpoints. RATE_LIMITS overrides the defaults
+# per route, e.g. {"/api/games/lucky-spin": {"user": {"rate": 2, "burst": 5}}}
+RATE_LIMITING_ENABLED = os.environ.get('RATE_LIMITING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+GAME_USER_RATE_LIMIT = RateLimitRule(
+    float(os.environ.get('GAME_USER_RATE_PER_SECOND', '5')), float(os.environ.get('GAME_USER_BURST', '10'))
+)
+GAME_IP_RATE_LIMIT = RateLimitRule(
+    float(os.environ.get('GAME_IP_RATE_PER_SECOND', '20')), float(os.environ.get('GAME_IP_BURST', '40'))
+)
+RATE_LIMITS = json.loads(os.environ.get('RATE_LIMITS', '{}'))
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', 'false').lower() in ('1', 'true', 'yes')
+LOAD_SHED_POOL_WAIT_MS = float(os.environ.get('LOAD_SHED_POOL_WAIT_MS', '100'))
+rate_limiter = RateLimiter(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000')))
+
+# Request admission
+requests_rate_limited = metrics.counter("requests_rate_limited_total", "Requests rejected with 429", ["route", "scope"])
+requests_shed = metrics.counter("requests_shed_total", "Requests shed with 503 because the Mongo pool was saturated", ["route"])
+
+# Password hashing pool
+password_wait = metrics.histogram("password_pool_wait_seconds", "Time password jobs waited for a pool slot")
+password_run = metrics.histogram("password_pool_run_seconds", "Time password jobs spent hashing or verifying")
+password_pool = PasswordPool(
+    kind=os.environ.get('PASSWORD_POOL_KIND', 'thread'),
+    max_workers=int(os.environ.get('PASSWORD_POOL_WORKERS', '4')),
+    max_queue=int(os.environ.get('PASSWORD_POOL_MAX_QUEUE', '64')),
+    on_complete=lambda waited, ran: (password_wait.observe(value=waited), password_run.observe(value=ran)),
+)
+
+# Authenticated principal cache
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '30')),
+)
+
+# Coin ledger
+ledger = LedgerWriter(
+    storage.append_ledger,
+    batch_size=int(os.environ.get('LEDGER_BATCH_SIZE', '500')),
+    flush_interval=float(os.environ.get('LEDGER_FLUSH_INTERVAL_SECONDS', '0.5')),
+    max_queue=int(os.environ.get('LEDGER_MAX_QUEUE', '10000')),
+)
+
+# Coin leaderboard
+leaderboard = Leaderboard(capacity=int(os.environ.get('LEADERBOARD_CAPACITY', '1000')))
+
+# Cross-worker cache invalidation from change streams (needs a replica set; otherwise TTL expiry)
+CHANGE_STREAMS_ENABLED = os.environ.get('CHANGE_STREAMS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+invalidation_bus = InvalidationBus(
+    storage,
+    collections=("users", "items"),
+    name=os.environ.get('CHANGE_STREAM_NAME', 'gamehub'),
+    fallback_interval=float(os.environ.get('CHANGE_STREAM_FALLBACK_SECONDS', os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '30'))),
+    retry_interval=float(os.environ.get('CHANGE_STREAM_RETRY_SECONDS', '5')),
+)
+
+# Catalog imports and bulk user provisioning
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+# Separate from password_pool so a bulk import cannot starve logins
+provisioning_pool = PasswordPool(
+    kind="process",
+    max_workers=int(os.environ.get('PROVISIONING_WORKERS', str(os.cpu_count() or 1))),
+    max_queue=int(os.environ.get('PROVISIONING_WORKERS', str(os.cpu_count() or 1))),
+)
+
+# Catalog page sizes
+ITEMS_PAGE_SIZE = int(os.environ.get('ITEMS_PAGE_SIZE', '50'))
+ITEMS_MAX_PAGE_SIZE = int(os.environ.get('ITEMS_MAX_PAGE_SIZE', '200'))
+
+# Cart checkout limits
+CHECKOUT_MAX_LINES = int(os.environ.get('CHECKOUT_MAX_LINES', '50'))
+CHECKOUT_MAX_QUANTITY = int(os.environ.get('CHECKOUT_MAX_QUANTITY', '100'))
+
+# Real-time balance push over server-sent events
+push_hub = PushHub(queue_size=int(os.environ.get('PUSH_QUEUE_SIZE', '32')))
+PUSH_HEARTBEAT_SECONDS = float(os.environ.get('PUSH_HEARTBEAT_SECONDS', '15'))
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -35,6 +148,7 @@ api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # Models
 class User(BaseModel):
@@ -43,7 +157,8 @@ class User(BaseModel):
     email: str
     password_hash: str
     coins: int = 1000
-    inventory: List[str] = Field(default_factory=list)
+    # item_id -> quantity owned
+    inventory: Dict[str, int] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class UserCreate(BaseModel):
@@ -51,10 +166,22 @@ class UserCreate(BaseModel):
     email: str
     password: str
 
+class UserProvision(BaseModel):
+    id: Optional[str] = None
+    username: str = Field(..., min_length=1)
+    email: str = Field(..., min_length=1)
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+    coins: int = Field(1000, ge=0)
+    created_at: Optional[datetime] = None
+
 class UserLogin(BaseModel):
     username: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class UserResponse(BaseModel):
     id: str
     username: str
@@ -70,21 +197,58 @@ class Item(BaseModel):
     description: str
     image_url: str = ""
 
+def validate_item(document: dict) -> dict:
+    return Item(**document).dict()
+
+# In-memory item catalog snapshot, loaded at startup
+item_catalog = ItemCatalog(normalize=validate_item)
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    username: str
+    coins: int
+
+class LeaderboardRank(BaseModel):
+    username: str
+    coins: int
+    # None when the player is outside the tracked top LEADERBOARD_CAPACITY
+    rank: Optional[int] = None
+
 class PurchaseRequest(BaseModel):
     item_id: str
 
+class CartLine(BaseModel):
+    item_id: str
+    quantity: int = Field(1, ge=1, le=CHECKOUT_MAX_QUANTITY)
+
+class CheckoutRequest(BaseModel):
+    items: List[CartLine] = Field(..., min_length=1, max_length=CHECKOUT_MAX_LINES)
+
 class GameResult(BaseModel):
     success: bool
     coins_won: int = 0
     item_won: Optional[str] = None
     message: str
+    plays: int = 1
+    net_gain: int = 0
+    results: List[int] = Field(default_factory=list)
+    balance: Optional[int] = None
 
 # Helper functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def run_password_job(func, *args):
+    try:
+        return await password_pool.run(func, *args)
+    except PasswordPoolSaturated:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+def user_response(user: User) -> UserResponse:
+    return UserResponse(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        coins=user.coins,
+        inventory=expand_inventory(user.inventory, item_catalog.snapshot.id_to_name),
+    )
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -93,24 +257,173 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_response(user: User, refresh_token: str) -> dict:
+    return {
+        "access_token": create_access_token(data={"sub": user.username}),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "user": user_response(user),
+    }
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    return await authenticate_token(credentials.credentials)
+
+async def authenticate_token(token: str) -> User:
+    username = principal_cache.get_username(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username = payload.get("sub")
+            if username is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+        except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    except jwt.PyJWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-    
-    user = await db.users.find_one({"username": username})
+        principal_cache.put_token(token, username, payload.get("exp"))
+    set_request_user(username)
+
+    cached_user = principal_cache.get_user(username)
+    if cached_user is not None:
+        return cached_user
+
+    user = await storage.get_user_by_username(username)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    user = User(**await storage.migrate_user_inventory(user, item_catalog.snapshot.name_to_id))
+    principal_cache.put_user(username, user)
+    return user
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def rate_limited_user(route: str):
+    overrides = RATE_LIMITS.get(route, {})
+    user_rule = RateLimitRule.from_dict(overrides.get("user", {}), GAME_USER_RATE_LIMIT)
+    ip_rule = RateLimitRule.from_dict(overrides.get("ip", {}), GAME_IP_RATE_LIMIT)
+
+    def admit(scope: str, key: str, rule: RateLimitRule):
+        wait = rate_limiter.acquire((route, scope, key), rule)
+        if wait is not None:
+            requests_rate_limited.inc(route, scope)
+            raise HTTPException(status_code=429, detail="Too many requests", headers=retry_after_header(wait))
+
+    async def check(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+        # Shed load and apply the per-IP bucket before the user is read, which may need the Mongo pool
+        if mongo_pool_listener.current_wait_seconds() * 1000 > LOAD_SHED_POOL_WAIT_MS:
+            requests_shed.inc(route)
+            raise HTTPException(status_code=503, detail="Server is busy, please retry", headers=retry_after_header(1))
+        if RATE_LIMITING_ENABLED:
+            admit("ip", client_ip(request), ip_rule)
+        current_user = await authenticate_token(credentials.credentials)
+        if RATE_LIMITING_ENABLED:
+            admit("user", current_user.id, user_rule)
+        return current_user
+
+    return check
+
+def publish_balance(user: User, delta: int, reason: str, inventory_changed: bool = False):
+    event = {"coins": user.coins, "delta": delta, "reason": reason}
+    if inventory_changed:
+        event["inventory"] = expand_inventory(user.inventory, item_catalog.snapshot.id_to_name)
+    push_hub.publish(user.id, "balance", event)
+
+async def seed_leaderboard():
+    users = await storage.top_users(leaderboard.capacity)
+    leaderboard.seed(users, complete=len(users) < leaderboard.capacity)
+
+def record_balance(user: User):
+    leaderboard.update(user.username, user.coins)
+    refill = getattr(app.state, "leaderboard_refill", None)
+    if leaderboard.needs_refill() and (refill is None or refill.done()):
+        app.state.leaderboard_refill = asyncio.create_task(seed_leaderboard())
+
+async def reload_catalog():
+    # Coalesce bursts of item changes into as few reloads as possible
+    while app.state.catalog_stale:
+        app.state.catalog_stale = False
+        forced, app.state.catalog_forced = app.state.catalog_forced, False
+        # A full reload reads every item; skip it when the collection's fingerprint has not moved
+        version = await storage.items_version()
+        if not forced and version == item_catalog.source_version:
+            continue
+        await item_catalog.load(storage.iter_items(), version)
+
+def held_in_catalog(document: dict) -> bool:
+    try:
+        item = validate_item(document)
+    except ValueError:
+        return False
+    return item_catalog.get(item["id"]) == item
+
+def on_items_changed(event: ChangeEvent):
+    if event.document is not None and held_in_catalog(event.document):
+        # Already loaded, e.g. the rest of a burst the last reload picked up
+        return
+    # A change made outside upsert_items does not move the fingerprint, so it forces the
+    # reload; a resync (or the TTL fallback) only reloads if the fingerprint moved
+    if event.operation != RESYNC:
+        app.state.catalog_forced = True
+    app.state.catalog_stale = True
+    reload = getattr(app.state, "catalog_reload", None)
+    if reload is None or reload.done():
+        app.state.catalog_reload = asyncio.create_task(reload_catalog())
+
+async def on_users_changed(event: ChangeEvent):
+    if event.operation == RESYNC:
+        principal_cache.users.clear()
+        await seed_leaderboard()
+        return
+    document = event.document
+    if document is None or not isinstance(document.get("inventory"), dict):
+        # Deleted, or not migrated yet: drop whatever we hold and let the next read reload it
+        if document is None:
+            principal_cache.users.clear()
+            await seed_leaderboard()
+        else:
+            principal_cache.invalidate_user(document["username"])
+        return
+    user = User(**document)
+    cached_user = principal_cache.get_user(user.username)
+    if cached_user is not None and cached_user.coins == user.coins and cached_user.inventory == user.inventory:
+        # Our own write, already applied when it was made
+        return
+    if cached_user is not None:
+        principal_cache.invalidate_user(user.username, user)
+    record_balance(user)
+    if push_hub.subscribed(user.id):
+        delta = user.coins - cached_user.coins if cached_user is not None else 0
+        publish_balance(user, delta, "sync", inventory_changed=True)
+
+invalidation_bus.subscribe("items", on_items_changed)
+invalidation_bus.subscribe("users", on_users_changed)
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+async def settle_plays(current_user: User, cost: int, coins_won: np.ndarray) -> User:
+    # The balance must cover every play up front. The guard must not depend on the outcomes:
+    # crediting winnings as they land would reject losing batches and accept winning ones.
+    required = cost * len(coins_won)
+    net_gain = int(coins_won.sum()) - required
+
+    updated_user = await storage.change_balance(current_user.id, net_gain, required)
+    if updated_user is None:
+        raise HTTPException(status_code=400, detail="Insufficient coins to play")
+
+    updated_user = User(**updated_user)
+    principal_cache.invalidate_user(current_user.username, updated_user)
+    record_balance(updated_user)
+    return updated_user
 
 # Initialize sample items
 async def init_sample_items():
-    existing_items = await db.items.find_one()
-    if not existing_items:
+    if not await storage.has_items():
         sample_items = [
             {"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 150, "description": "A sharp steel sword for battle", "image_url": "https://images.unsplash.com/photo-1598300042247-d088f8ab3a91?w=300&h=300&fit=crop"},
             {"item_type": "Weapon", "item_name": "Magic Staff", "coin_price": 300, "description": "A powerful magic staff", "image_url": "https://images.unsplash.com/photo-1578662996442-48f60103fc96?w=300&h=300&fit=crop"},
@@ -122,186 +435,416 @@ async def init_sample_items():
             {"item_type": "Power-up", "item_name": "Strength Elixir", "coin_price": 35, "description": "Doubles your strength for 10 minutes", "image_url": "https://images.unsplash.com/photo-1582719471384-894fbb16e074?w=300&h=300&fit=crop"},
         ]
         
-        for item_data in sample_items:
-            item = Item(**item_data)
-            await db.items.insert_one(item.dict())
+        await import_items(iter_documents(sample_items), storage, validate_item)
 
 # Authentication endpoints
 @api_router.post("/auth/register", response_model=dict)
 async def register(user_data: UserCreate):
     # Check if user exists
-    existing_user = await db.users.find_one({"$or": [{"username": user_data.username}, {"email": user_data.email}]})
-    if existing_user:
+    if await storage.user_exists(user_data.username, user_data.email):
         raise HTTPException(status_code=400, detail="Username or email already registered")
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await run_password_job(hash_password, user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
         password_hash=hashed_password
     )
     
-    await db.users.insert_one(user.dict())
-    
-    # Create access token
-    access_token = create_access_token(data={"sub": user.username})
+    try:
+        await storage.insert_user(user.dict())
+    except DuplicateError:
+        raise HTTPException(status_code=400, detail="Username or email already registered")
+    record_balance(user)
     
-    return {"access_token": access_token, "token_type": "bearer", "user": UserResponse(**user.dict())}
+    # Create access and refresh tokens
+    refresh_token = await session_manager.issue(user.id, user.username)
+    return token_response(user, refresh_token)
 
 @api_router.post("/auth/login", response_model=dict)
 async def login(user_data: UserLogin):
-    user = await db.users.find_one({"username": user_data.username})
-    if not user or not verify_password(user_data.password, user["password_hash"]):
+    user = await storage.get_user_by_username(user_data.username)
+    if not user or not await run_password_job(verify_password, user_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    set_request_user(user_data.username)
     
-    access_token = create_access_token(data={"sub": user["username"]})
-    
-    return {"access_token": access_token, "token_type": "bearer", "user": UserResponse(**user)}
+    user = User(**await storage.migrate_user_inventory(user, item_catalog.snapshot.name_to_id))
+    refresh_token = await session_manager.issue(user.id, user.username)
+    return token_response(user, refresh_token)
+
+@api_router.post("/auth/refresh", response_model=dict)
+async def refresh(request_data: RefreshRequest):
+    # No bcrypt here: the refresh token is checked by its SHA-256 hash and rotated atomically
+    try:
+        session, refresh_token = await session_manager.rotate(request_data.refresh_token)
+    except SessionInvalid:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    set_request_user(session["username"])
+
+    user = principal_cache.get_user(session["username"])
+    if user is None:
+        document = await storage.get_user_by_username(session["username"])
+        if document is None:
+            await session_manager.revoke_user(session["user_id"])
+            raise HTTPException(status_code=401, detail="User not found")
+        user = User(**await storage.migrate_user_inventory(document, item_catalog.snapshot.name_to_id))
+        principal_cache.put_user(user.username, user)
+    return token_response(user, refresh_token)
+
+@api_router.post("/auth/logout", response_model=dict)
+async def logout(request_data: RefreshRequest):
+    # Access tokens are stateless JWTs and stay valid until they expire
+    await session_manager.revoke(request_data.refresh_token)
+    return {"message": "Logged out"}
+
+@api_router.post("/auth/logout-all", response_model=dict)
+async def logout_all(current_user: User = Depends(get_current_user)):
+    revoked = await session_manager.revoke_user(current_user.id)
+    push_hub.disconnect(current_user.id)
+    return {"message": "Logged out everywhere", "sessions_revoked": revoked}
 
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return UserResponse(**current_user.dict())
+    return user_response(current_user)
 
 # Webshop endpoints
 @api_router.get("/items", response_model=List[Item])
-async def get_items():
-    items = await db.items.find().to_list(1000)
-    return [Item(**item) for item in items]
+async def get_items(
+    item_type: Optional[str] = Query(None),
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    sort: str = Query("catalog", pattern="^(" + "|".join(SORTS) + ")$"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(ITEMS_PAGE_SIZE, ge=1, le=ITEMS_MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+):
+    # Pages are keyset slices of the in-memory snapshot; the cursor is the key of the last item sent
+    snapshot = item_catalog.snapshot
+    if sort == "catalog" and (min_price is not None or max_price is not None):
+        raise HTTPException(status_code=400, detail="Price filters need sort=price_asc or sort=price_desc")
+    try:
+        after = decode_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    etag = snapshot.page_etag(item_type, min_price, max_price, sort, cursor, limit)
+    headers = {"ETag": etag, "X-Catalog-Version": str(snapshot.version)}
+    if snapshot.matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    page = snapshot.page(item_type, min_price, max_price, sort, after, limit)
+    headers["X-Total-Count"] = str(page.total)
+    if page.next_key is not None:
+        headers["X-Next-Cursor"] = encode_cursor(sort, page.next_key)
+    return Response(content=page.body, media_type="application/json", headers=headers)
 
 @api_router.post("/purchase", response_model=dict)
 async def purchase_item(purchase: PurchaseRequest, current_user: User = Depends(get_current_user)):
     # Get item
-    item = await db.items.find_one({"id": purchase.item_id})
+    item = item_catalog.get(purchase.item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
-    item_obj = Item(**item)
-    
-    # Check if user has enough coins
-    if current_user.coins < item_obj.coin_price:
+    # Debit coins and add the item in one conditional update; no match means the balance was too low
+    updated_user = await storage.purchase(
+        current_user.id, {purchase.item_id: 1}, item["coin_price"], item_catalog.snapshot.name_to_id
+    )
+    if updated_user is None:
         raise HTTPException(status_code=400, detail="Insufficient coins")
     
-    # Update user coins and inventory
-    new_coins = current_user.coins - item_obj.coin_price
-    new_inventory = current_user.inventory + [item_obj.item_name]
-    
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"coins": new_coins, "inventory": new_inventory}}
+    updated_user = User(**updated_user)
+    principal_cache.invalidate_user(current_user.username, updated_user)
+    record_balance(updated_user)
+    await ledger.record(
+        updated_user.id, updated_user.username, "purchase", purchase.item_id, -item["coin_price"], updated_user.coins
     )
+    publish_balance(updated_user, -item["coin_price"], "purchase", inventory_changed=True)
     
-    return {"message": f"Successfully purchased {item_obj.item_name}!", "coins_remaining": new_coins}
+    return {
+        "message": f"Successfully purchased {item['item_name']}!",
+        "coins_remaining": updated_user.coins,
+        "inventory": expand_inventory(updated_user.inventory, item_catalog.snapshot.id_to_name),
+    }
 
-# Game endpoints
-@api_router.post("/games/lucky-spin", response_model=GameResult)
-async def play_lucky_spin(current_user: User = Depends(get_current_user)):
-    SPIN_COST = 50
+@api_router.post("/checkout", response_model=dict)
+async def checkout(cart: CheckoutRequest, current_user: User = Depends(get_current_user)):
+    # Price the whole cart from the in-memory catalog
+    quantities: Dict[str, int] = {}
+    for line in cart.items:
+        quantities[line.item_id] = quantities.get(line.item_id, 0) + line.quantity
+    # The per-line limit alone could be sidestepped by repeating an item across lines
+    over_limit = [item_id for item_id, quantity in quantities.items() if quantity > CHECKOUT_MAX_QUANTITY]
+    if over_limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CHECKOUT_MAX_QUANTITY} of each item per checkout: {', '.join(over_limit)}",
+        )
+    missing = [item_id for item_id in quantities if item_catalog.get(item_id) is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Items not found: {', '.join(missing)}")
+    lines = []
+    for item_id, quantity in quantities.items():
+        item = item_catalog.get(item_id)
+        lines.append({
+            "item_id": item_id,
+            "item_name": item["item_name"],
+            "quantity": quantity,
+            "coin_price": item["coin_price"],
+            "subtotal": item["coin_price"] * quantity,
+        })
+    total = sum(line["subtotal"] for line in lines)
     
-    if current_user.coins < SPIN_COST:
-        raise HTTPException(status_code=400, detail="Insufficient coins to play")
-    
-    # Random rewards
-    outcomes = [
-        {"coins": 10, "probability": 0.3},
-        {"coins": 25, "probability": 0.25},
-        {"coins": 50, "probability": 0.2},
-        {"coins": 100, "probability": 0.15},
-        {"coins": 200, "probability": 0.08},
-        {"coins": 500, "probability": 0.02},
-    ]
-    
-    rand = random.random()
-    cumulative = 0
-    coins_won = 10  # fallback
+    # The whole cart is one conditional update, same as a single purchase; the cached
+    # principal's balance may be stale, so the update's own guard decides
+    updated_user = await storage.purchase(current_user.id, quantities, total, item_catalog.snapshot.name_to_id)
+    if updated_user is None:
+        raise HTTPException(status_code=400, detail="Insufficient coins")
     
-    for outcome in outcomes:
-        cumulative += outcome["probability"]
-        if rand <= cumulative:
-            coins_won = outcome["coins"]
-            break
+    updated_user = User(**updated_user)
+    principal_cache.invalidate_user(current_user.username, updated_user)
+    record_balance(updated_user)
+    balance = updated_user.coins + total
+    for line in lines:
+        balance -= line["subtotal"]
+        await ledger.record(
+            updated_user.id, updated_user.username, "purchase", line["item_id"], -line["subtotal"], balance, line["quantity"]
+        )
+    publish_balance(updated_user, -total, "checkout", inventory_changed=True)
     
-    # Update user coins
-    new_coins = current_user.coins - SPIN_COST + coins_won
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"coins": new_coins}}
+    return {
+        "message": f"Successfully purchased {sum(quantities.values())} items!",
+        "items": lines,
+        "total": total,
+        "coins_remaining": updated_user.coins,
+        "inventory": expand_inventory(updated_user.inventory, item_catalog.snapshot.id_to_name),
+    }
+
+# Game endpoints
+def make_game_endpoint(game: Game, route: str):
+    async def play_game(count: int = Query(1, ge=1, le=GAME_MAX_BATCH), current_user: User = Depends(rate_limited_user(route))):
+        results = game.draw(worker_rng(), count)
+        updated_user = await settle_plays(current_user, game.cost, results)
+        
+        coins_won = int(results.sum())
+        net_gain = coins_won - game.cost * count
+        await ledger.record(updated_user.id, updated_user.username, "game", game.slug, net_gain, updated_user.coins, count)
+        publish_balance(updated_user, net_gain, game.slug)
+        template = game.message if count == 1 else game.batch_message
+        message = f"{template.format(coins_won=coins_won, count=count)} Net: {'+' if net_gain >= 0 else ''}{net_gain} coins"
+        
+        return GameResult(
+            success=True,
+            coins_won=coins_won,
+            message=message,
+            plays=count,
+            net_gain=net_gain,
+            results=results.tolist(),
+            balance=updated_user.coins
+        )
+    return play_game
+
+for game in game_registry:
+    api_router.add_api_route(
+        f"/games/{game.slug}",
+        make_game_endpoint(game, f"{api_router.prefix}/games/{game.slug}"),
+        methods=["POST"],
+        response_model=GameResult,
+        name=f"play_{game.slug.replace('-', '_')}",
     )
-    
-    net_gain = coins_won - SPIN_COST
-    message = f"You won {coins_won} coins! Net: {'+' if net_gain >= 0 else ''}{net_gain} coins"
-    
-    return GameResult(
-        success=True,
-        coins_won=coins_won,
-        message=message
+
+# Push endpoints
+@api_router.get("/events")
+async def stream_events(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    # EventSource cannot send headers, so browsers pass the access token as ?token=
+    token = credentials.credentials if credentials else token
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await authenticate_token(token)
+    # End the stream when the token expires; reconnecting then needs a refreshed token,
+    # which re-checks the session
+    expires_at = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False}).get("exp")
+    return StreamingResponse(
+        push_hub.stream(user.id, user_response(user).dict(), PUSH_HEARTBEAT_SECONDS, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-@api_router.post("/games/egg-smash", response_model=GameResult)
-async def play_egg_smash(current_user: User = Depends(get_current_user)):
-    SMASH_COST = 25
-    
-    if current_user.coins < SMASH_COST:
-        raise HTTPException(status_code=400, detail="Insufficient coins to play")
-    
-    # Random rewards
-    outcomes = [
-        {"coins": 5, "probability": 0.4},
-        {"coins": 15, "probability": 0.3},
-        {"coins": 30, "probability": 0.15},
-        {"coins": 50, "probability": 0.1},
-        {"coins": 100, "probability": 0.04},
-        {"coins": 200, "probability": 0.01},
-    ]
-    
-    rand = random.random()
-    cumulative = 0
-    coins_won = 5  # fallback
-    
-    for outcome in outcomes:
-        cumulative += outcome["probability"]
-        if rand <= cumulative:
-            coins_won = outcome["coins"]
-            break
-    
-    # Update user coins
-    new_coins = current_user.coins - SMASH_COST + coins_won
-    await db.users.update_one(
-        {"id": current_user.id},
-        {"$set": {"coins": new_coins}}
+# Leaderboard endpoints
+@api_router.get("/leaderboard", response_model=List[LeaderboardEntry])
+async def get_leaderboard(limit: int = Query(10, ge=1, le=100)):
+    return leaderboard.top(limit)
+
+@api_router.get("/leaderboard/me", response_model=LeaderboardRank)
+async def get_my_rank(current_user: User = Depends(get_current_user)):
+    return LeaderboardRank(username=current_user.username, coins=current_user.coins, rank=leaderboard.rank(current_user.username))
+
+# Admin endpoints
+@api_router.get("/admin/profiles")
+async def list_profiles(admin: User = Depends(get_admin_user)):
+    return {"enabled": PROFILING_ENABLED, "sample_rate": PROFILE_SAMPLE_RATE, "profiles": profile_store.list()}
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, admin: User = Depends(get_admin_user)):
+    entry = profile_store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    filename = f"{entry['route'].strip('/').replace('/', '_')}-{profile_id}.prof"
+    return Response(
+        content=entry["stats"],
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
-    
-    net_gain = coins_won - SMASH_COST
-    message = f"You smashed an egg and won {coins_won} coins! Net: {'+' if net_gain >= 0 else ''}{net_gain} coins"
-    
-    return GameResult(
-        success=True,
-        coins_won=coins_won,
-        message=message
+
+@api_router.post("/admin/items/import")
+async def import_catalog(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(" + "|".join(FORMATS) + ")$"),
+    key: str = Query("item_name", pattern="^(id|item_name)$"),
+    admin: User = Depends(get_admin_user),
+):
+    # The body is streamed through the pipeline chunk by chunk, never read whole
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    report = await import_items(
+        parse_rows(iter_lines(request.stream()), format), storage, validate_item, key=key, chunk_size=IMPORT_CHUNK_SIZE
     )
+    app.state.catalog_stale = True
+    await reload_catalog()
+    return report.dict()
+
+def validate_provisioned_user(document: dict) -> dict:
+    return UserProvision(**document).dict()
+
+def make_user(fields: dict) -> dict:
+    return User(**fields).dict()
+
+@api_router.post("/admin/users/import")
+async def import_users(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(" + "|".join(FORMATS) + ")$"),
+    admin: User = Depends(get_admin_user),
+):
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    report = await provision_users(
+        parse_rows(iter_lines(request.stream()), format), storage, validate_provisioned_user, make_user,
+        provisioning_pool.hash_many, chunk_size=IMPORT_CHUNK_SIZE,
+    )
+    await seed_leaderboard()
+    return report.dict()
+
+@api_router.delete("/admin/profiles")
+async def clear_profiles(admin: User = Depends(get_admin_user)):
+    profile_store.clear()
+    return {"message": "Profiles cleared"}
+
+# Metrics
+password_jobs = metrics.gauge("password_pool_jobs", "Password jobs running or queued", ["state"])
+password_rejected = metrics.counter("password_pool_rejected_total", "Password jobs rejected because the pool was saturated")
+cache_lookups = metrics.counter("principal_cache_lookups_total", "Principal cache lookups", ["cache", "result"])
+cache_size = metrics.gauge("principal_cache_entries", "Principal cache entries", ["cache"])
+ledger_queue = metrics.gauge("ledger_queue_depth", "Ledger entries waiting to be written")
+ledger_entries = metrics.counter("ledger_entries_total", "Ledger entries by outcome", ["outcome"])
+ledger_lag = metrics.gauge("ledger_lag_seconds", "Ledger lag", ["measure"])
+catalog_version = metrics.gauge("catalog_version", "Version of the in-memory item catalog")
+push_connections = metrics.gauge("push_connections", "Open server-sent event streams")
+push_events = metrics.counter("push_events_total", "Push events by outcome", ["outcome"])
+invalidation_mode = metrics.gauge("invalidation_mode", "Current invalidation bus mode (1 for the active one)", ["mode"])
+log_dropped = metrics.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
+invalidation_events = metrics.counter("invalidation_events_total", "Change events delivered to caches", ["collection", "operation"])
+refresh_sessions = metrics.counter("refresh_sessions_total", "Refresh-token session events", ["event"])
+
+@metrics.collector
+def collect_component_stats():
+    pool = password_pool.stats()
+    password_jobs.set("running", value=pool["running"])
+    password_jobs.set("queued", value=pool["queued"])
+    password_rejected.set(value=pool["rejected"])
+    for cache, stats in principal_cache.stats().items():
+        cache_lookups.set(cache, "hit", value=stats["hits"])
+        cache_lookups.set(cache, "miss", value=stats["misses"])
+        cache_size.set(cache, value=stats["size"])
+    queue = ledger.stats()
+    ledger_queue.set(value=queue["queued"])
+    for outcome in ("enqueued", "written", "dropped"):
+        ledger_entries.set(outcome, value=queue[outcome])
+    ledger_lag.set("last", value=queue["last_lag_seconds"])
+    ledger_lag.set("oldest_pending", value=queue["oldest_pending_seconds"])
+    catalog_version.set(value=item_catalog.version)
+    push_connections.set(value=push_hub.connections())
+    log_dropped.set(value=sum(getattr(handler, "dropped", 0) for handler in logging.getLogger().handlers))
+    push_events.set("published", value=push_hub.published)
+    push_events.set("dropped", value=push_hub.dropped)
+    for mode in ("stopped", "starting", "streaming", "reconnecting", "ttl"):
+        invalidation_mode.set(mode, value=1 if invalidation_bus.mode == mode else 0)
+    for (collection, operation), count in invalidation_bus.events.items():
+        invalidation_events.set(collection, operation, value=count)
+    for event, count in session_manager.stats().items():
+        refresh_sessions.set(event, value=count)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    RequestLogMiddleware,
+    sample_rate=float(os.environ.get('LOG_REQUEST_SAMPLE_RATE', '1.0')),
+    slow_seconds=float(os.environ.get('LOG_SLOW_REQUEST_MS', '1000')) / 1000,
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilerMiddleware, store=profile_store, enabled=PROFILING_ENABLED, sample_rate=PROFILE_SAMPLE_RATE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Catalog-Version", "X-Total-Count", "X-Next-Cursor", "X-Request-ID"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Configure logging: handlers run on a background listener, never on the event loop
+log_listener = configure_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'json'),
+    queue_size=int(os.environ.get('LOG_QUEUE_SIZE', '10000')),
 )
 logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
+    game_registry.compile()
+    ledger.start()
+    index_status = await storage.apply_indexes(index_registry)
+    ready = sum(1 for entry in index_status if entry["state"] == "ready")
+    failed = [entry["name"] for entry in index_status if entry["state"] == "failed"]
+    logger.info("Indexes ready: %d/%d (%s storage)", ready, len(index_status), storage.name)
+    if failed:
+        logger.warning("Index builds failed: %s", ", ".join(failed))
     await init_sample_items()
+    await item_catalog.load(storage.iter_items(), await storage.items_version())
+    await seed_leaderboard()
+    app.state.catalog_stale = False
+    app.state.catalog_forced = False
+    if CHANGE_STREAMS_ENABLED:
+        invalidation_bus.start()
+    # Legacy list inventories are migrated lazily on read; this converts everyone else in the background
+    app.state.inventory_migration = asyncio.create_task(
+        storage.migrate_inventories(item_catalog.snapshot.name_to_id)
+    )
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    app.state.inventory_migration.cancel()
+    await invalidation_bus.stop()
+    await ledger.drain()
+    storage.close()
+    password_pool.shutdown()
+    provisioning_pool.shutdown()
+    log_listener.stop()
\ No newline at end of file
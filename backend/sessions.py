@@ -0,0 +1,84 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+
+class SessionInvalid(Exception):
+    """Raised when a refresh token is unknown, expired, revoked or already used."""
+
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens carry 256 random bits, so a fast hash is enough; no bcrypt needed
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class SessionManager:
+    """Rotating refresh tokens backed by hashed session records.
+
+    Every refresh consumes the presented token and issues a new one in the same
+    family. Presenting a token that was already rotated means it was copied, so the
+    whole family is revoked and the holder has to sign in again. Only token hashes
+    are stored, and each record expires ``lifetime`` after it was issued.
+    """
+
+    def __init__(self, storage, lifetime: timedelta):
+        self.storage = storage
+        self.lifetime = lifetime
+        # Metrics
+        self.issued = 0
+        self.rotated = 0
+        self.rejected = 0
+        self.reuse_detected = 0
+
+    async def issue(self, user_id: str, username: str, family_id: Optional[str] = None) -> str:
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        await self.storage.insert_session({
+            "id": str(uuid.uuid4()),
+            "family_id": family_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "username": username,
+            "token_hash": hash_refresh_token(token),
+            "created_at": now,
+            "expires_at": now + self.lifetime,
+            "rotated_at": None,
+            "revoked_at": None,
+        })
+        self.issued += 1
+        return token
+
+    async def rotate(self, token: str) -> Tuple[dict, str]:
+        """Consume ``token``; returns its session and the refresh token that replaces it."""
+        token_hash = hash_refresh_token(token)
+        session = await self.storage.claim_session(token_hash, datetime.utcnow())
+        if session is None:
+            self.rejected += 1
+            stale = await self.storage.find_session(token_hash)
+            if stale is not None and stale["rotated_at"] is not None and stale["revoked_at"] is None:
+                self.reuse_detected += 1
+                await self.storage.revoke_sessions(datetime.utcnow(), family_id=stale["family_id"])
+            raise SessionInvalid()
+        new_token = await self.issue(session["user_id"], session["username"], session["family_id"])
+        self.rotated += 1
+        return session, new_token
+
+    async def revoke(self, token: str) -> bool:
+        """Sign out the device holding ``token`` by revoking its whole token family."""
+        session = await self.storage.find_session(hash_refresh_token(token))
+        if session is None:
+            return False
+        await self.storage.revoke_sessions(datetime.utcnow(), family_id=session["family_id"])
+        return True
+
+    async def revoke_user(self, user_id: str) -> int:
+        return await self.storage.revoke_sessions(datetime.utcnow(), user_id=user_id)
+
+    def stats(self) -> dict:
+        return {
+            "issued": self.issued,
+            "rotated": self.rotated,
+            "rejected": self.rejected,
+            "reuse_detected": self.reuse_detected,
+        }
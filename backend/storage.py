@@ -0,0 +1,524 @@
+import copy
+import heapq
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, ReadPreference, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from inventory import count_inventory, migrate_inventories, migrate_user_inventory
+
+
+class DuplicateError(Exception):
+    """Raised when an insert collides with an existing unique key."""
+
+
+class ChangeStreamUnavailable(Exception):
+    """Raised when the backend cannot provide change streams (e.g. a standalone mongod)."""
+
+
+class ResumeTokenInvalid(Exception):
+    """Raised when a change stream cannot resume from the given token."""
+
+
+# Columns a users export may read; never credentials or email addresses
+EXPORT_FIELDS = ("id", "username", "coins", "inventory", "created_at")
+
+# Server error codes: not a replica set, and resume points that no longer exist
+CHANGE_STREAM_UNSUPPORTED_CODES = {40573}
+RESUME_FAILED_CODES = {260, 280, 286}
+
+
+class Storage:
+    """Everything the routes need from the database.
+
+    Implementations return plain documents (dicts) shaped like the ``users``, ``items``
+    and ``ledger`` collections. Balance changes are conditional: they return the updated
+    user, or ``None`` when the guard on the current balance did not hold.
+    """
+
+    name = "abstract"
+
+    # Users
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def user_exists(self, username: str, email: str) -> bool:
+        raise NotImplementedError
+
+    async def insert_user(self, user: dict):
+        raise NotImplementedError
+
+    async def existing_users(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        """Which of ``usernames`` and ``emails`` are already taken, in one round trip."""
+        raise NotImplementedError
+
+    async def insert_users(self, users: List[dict]) -> dict:
+        """Insert ``users`` unordered; returns ``{"inserted", "duplicates", "errors"}``.
+
+        ``duplicates`` lists the indexes that hit a unique key and ``errors`` lists
+        ``(index, message)`` for any other failure.
+        """
+        raise NotImplementedError
+
+    def iter_users(self, after: Optional[str] = None, batch_size: int = 1000) -> AsyncIterator[Tuple[str, dict]]:
+        """Stream ``EXPORT_FIELDS`` of every user in a stable order as ``(resume_key, user)``.
+
+        Passing the last key seen as ``after`` continues where a previous stream stopped.
+        """
+        raise NotImplementedError
+
+    async def purchase(self, user_id: str, quantities: Mapping[str, int], total: int,
+                       name_to_id: Mapping[str, str]) -> Optional[dict]:
+        """Debit ``total`` and add ``quantities`` (item id -> count) to the inventory if the balance covers it.
+
+        A legacy list inventory is migrated with ``name_to_id`` first.
+        """
+        raise NotImplementedError
+
+    async def change_balance(self, user_id: str, delta: int, min_balance: int) -> Optional[dict]:
+        """Add ``delta`` to the balance if it is currently at least ``min_balance``."""
+        raise NotImplementedError
+
+    async def top_users(self, limit: int) -> List[dict]:
+        """The ``limit`` richest users as ``{"username", "coins"}``, ties broken by username."""
+        raise NotImplementedError
+
+    async def migrate_user_inventory(self, user: dict, name_to_id: Mapping[str, str]) -> dict:
+        raise NotImplementedError
+
+    async def migrate_inventories(self, name_to_id: Mapping[str, str]) -> int:
+        raise NotImplementedError
+
+    # Items
+    async def has_items(self) -> bool:
+        raise NotImplementedError
+
+    async def upsert_items(self, items: List[Tuple[dict, dict]], key: str) -> dict:
+        """Insert or update ``(fields, defaults)`` pairs matched on ``fields[key]``.
+
+        ``fields`` are written to new and existing items alike; ``defaults`` (the
+        model defaults for columns the row left out, and the generated ``id`` unless
+        ``key`` is ``id``) are only written when the item is inserted.
+
+        Returns ``{"inserted", "updated", "unchanged", "errors"}`` where ``errors`` lists
+        ``(index, message)`` for the items that could not be written.
+        """
+        raise NotImplementedError
+
+    def iter_items(self) -> AsyncIterator[dict]:
+        raise NotImplementedError
+
+    async def items_version(self) -> Any:
+        """A cheap fingerprint of the ``items`` collection: ``(write version, item count)``.
+
+        ``upsert_items`` bumps the write version whenever it changes anything, so an
+        unchanged fingerprint means a full reload would find nothing new.
+        """
+        raise NotImplementedError
+
+    # Ledger
+    async def append_ledger(self, entries: List[dict]):
+        """Insert ``entries``; entries whose ``id`` is already stored are skipped, so retries are safe."""
+        raise NotImplementedError
+
+    # Refresh-token sessions
+    async def insert_session(self, session: dict):
+        raise NotImplementedError
+
+    async def claim_session(self, token_hash: str, now: datetime) -> Optional[dict]:
+        """Mark the active session for ``token_hash`` as rotated and return it; None if it is not active."""
+        raise NotImplementedError
+
+    async def find_session(self, token_hash: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def revoke_sessions(self, now: datetime, family_id: Optional[str] = None,
+                              user_id: Optional[str] = None) -> int:
+        """Revoke every unrevoked session of a token family or of a user; returns how many."""
+        raise NotImplementedError
+
+    # Change streams
+    def watch_changes(self, collections: Sequence[str], resume_after: Optional[Any] = None,
+                      max_await_seconds: float = 1.0) -> AsyncIterator[Tuple[Any, Optional[dict]]]:
+        """Tail inserts, updates, replaces and deletes on ``collections``.
+
+        Yields ``(resume_token, change)`` pairs; ``change`` is None when nothing happened
+        within ``max_await_seconds``, so callers can checkpoint the token while idle.
+        """
+        raise ChangeStreamUnavailable(f"{self.name} storage has no change streams")
+
+    async def load_resume_token(self, name: str) -> Optional[Any]:
+        return None
+
+    async def save_resume_token(self, name: str, token: Any):
+        pass
+
+    # Lifecycle
+    async def apply_indexes(self, registry) -> List[dict]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+
+    def __init__(self, mongo_url: str, db_name: str, **client_options):
+        self.client = AsyncIOMotorClient(mongo_url, **client_options)
+        self.db = self.client[db_name]
+
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        return await self.db.users.find_one({"username": username})
+
+    async def user_exists(self, username: str, email: str) -> bool:
+        existing_user = await self.db.users.find_one(
+            {"$or": [{"username": username}, {"email": email}]}, {"_id": 1}
+        )
+        return existing_user is not None
+
+    async def insert_user(self, user: dict):
+        try:
+            await self.db.users.insert_one(user)
+        except DuplicateKeyError as e:
+            raise DuplicateError(str(e))
+
+    async def existing_users(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        cursor = self.db.users.find(
+            {"$or": [{"username": {"$in": usernames}}, {"email": {"$in": emails}}]},
+            {"_id": 0, "username": 1, "email": 1},
+        )
+        taken_usernames, taken_emails = set(), set()
+        async for user in cursor:
+            taken_usernames.add(user["username"])
+            taken_emails.add(user["email"])
+        return taken_usernames, taken_emails
+
+    async def iter_users(self, after: Optional[str] = None, batch_size: int = 1000) -> AsyncIterator[Tuple[str, dict]]:
+        # Prefer a secondary so long exports stay off the primary the API writes to
+        users = self.db.users.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
+        query = {"_id": {"$gt": ObjectId(after)}} if after else {}
+        projection = {field: 1 for field in EXPORT_FIELDS}
+        async for user in users.find(query, projection, sort=[("_id", 1)], batch_size=batch_size):
+            yield str(user.pop("_id")), user
+
+    async def insert_users(self, users: List[dict]) -> dict:
+        if not users:
+            return {"inserted": 0, "duplicates": [], "errors": []}
+        try:
+            result = await self.db.users.insert_many(users, ordered=False)
+            return {"inserted": len(result.inserted_ids), "duplicates": [], "errors": []}
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+            return {
+                "inserted": e.details["nInserted"],
+                "duplicates": [error["index"] for error in write_errors if error["code"] == 11000],
+                "errors": [(error["index"], error["errmsg"]) for error in write_errors if error["code"] != 11000],
+            }
+
+    async def purchase(self, user_id: str, quantities: Mapping[str, int], total: int,
+                       name_to_id: Mapping[str, str]) -> Optional[dict]:
+        increments = {f"inventory.{item_id}": quantity for item_id, quantity in quantities.items()}
+        for _ in range(2):
+            # $inc on a field of a list fails, so users the lazy migration has not reached yet don't match
+            updated = await self.db.users.find_one_and_update(
+                {"id": user_id, "coins": {"$gte": total}, "inventory": {"$not": {"$type": "array"}}},
+                {"$inc": {"coins": -total, **increments}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if updated is not None:
+                return updated
+            legacy = await self.db.users.find_one({"id": user_id, "inventory": {"$type": "array"}})
+            if legacy is None:
+                return None
+            await migrate_user_inventory(self.db.users, legacy, name_to_id)
+        return None
+
+    async def change_balance(self, user_id: str, delta: int, min_balance: int) -> Optional[dict]:
+        return await self.db.users.find_one_and_update(
+            {"id": user_id, "coins": {"$gte": min_balance}},
+            {"$inc": {"coins": delta}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def top_users(self, limit: int) -> List[dict]:
+        cursor = self.db.users.find({}, {"_id": 0, "username": 1, "coins": 1})
+        return await cursor.sort([("coins", -1), ("username", 1)]).limit(limit).to_list(limit)
+
+    async def migrate_user_inventory(self, user: dict, name_to_id: Mapping[str, str]) -> dict:
+        return await migrate_user_inventory(self.db.users, user, name_to_id)
+
+    async def migrate_inventories(self, name_to_id: Mapping[str, str]) -> int:
+        return await migrate_inventories(self.db.users, name_to_id)
+
+    async def has_items(self) -> bool:
+        return await self.db.items.find_one({}, {"_id": 1}) is not None
+
+    async def upsert_items(self, items: List[Tuple[dict, dict]], key: str) -> dict:
+        operations = []
+        for fields, defaults in items:
+            update = {"$set": fields}
+            if defaults:
+                update["$setOnInsert"] = defaults
+            operations.append(UpdateOne({key: fields[key]}, update, upsert=True))
+        try:
+            result = (await self.db.items.bulk_write(operations, ordered=False)).bulk_api_result
+            errors = []
+        except BulkWriteError as e:
+            result = e.details
+            errors = [(error["index"], error["errmsg"]) for error in result["writeErrors"]]
+        if result["nUpserted"] or result["nModified"]:
+            await self.db.catalog_state.update_one({"_id": "items"}, {"$inc": {"version": 1}}, upsert=True)
+        return {
+            "inserted": result["nUpserted"],
+            "updated": result["nModified"],
+            "unchanged": result["nMatched"] - result["nModified"],
+            "errors": errors,
+        }
+
+    async def iter_items(self) -> AsyncIterator[dict]:
+        async for item in self.db.items.find({}, {"_id": 0}):
+            yield item
+
+    async def items_version(self) -> Any:
+        state = await self.db.catalog_state.find_one({"_id": "items"})
+        # Read from collection metadata, no scan; catches deletes made outside upsert_items
+        count = await self.db.items.estimated_document_count()
+        return (state["version"] if state else 0, count)
+
+    async def append_ledger(self, entries: List[dict]):
+        # Keyed by the entry id, so retrying a batch the server already applied is a no-op
+        try:
+            await self.db.ledger.bulk_write([InsertOne({**entry, "_id": entry["id"]}) for entry in entries], ordered=False)
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors") or any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    async def insert_session(self, session: dict):
+        await self.db.sessions.insert_one(session)
+
+    async def claim_session(self, token_hash: str, now: datetime) -> Optional[dict]:
+        return await self.db.sessions.find_one_and_update(
+            {"token_hash": token_hash, "rotated_at": None, "revoked_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"rotated_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def find_session(self, token_hash: str) -> Optional[dict]:
+        return await self.db.sessions.find_one({"token_hash": token_hash})
+
+    async def revoke_sessions(self, now: datetime, family_id: Optional[str] = None,
+                              user_id: Optional[str] = None) -> int:
+        query = {"family_id": family_id} if family_id is not None else {"user_id": user_id}
+        result = await self.db.sessions.update_many({**query, "revoked_at": None}, {"$set": {"revoked_at": now}})
+        return result.modified_count
+
+    async def watch_changes(self, collections: Sequence[str], resume_after: Optional[Any] = None,
+                            max_await_seconds: float = 1.0) -> AsyncIterator[Tuple[Any, Optional[dict]]]:
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(collections)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        try:
+            async with self.db.watch(
+                pipeline,
+                full_document="updateLookup",
+                resume_after=resume_after,
+                max_await_time_ms=int(max_await_seconds * 1000),
+            ) as stream:
+                while stream.alive:
+                    change = await stream.try_next()
+                    yield stream.resume_token, change
+        except OperationFailure as e:
+            if e.code in CHANGE_STREAM_UNSUPPORTED_CODES:
+                raise ChangeStreamUnavailable(str(e))
+            if e.code in RESUME_FAILED_CODES:
+                raise ResumeTokenInvalid(str(e))
+            raise
+
+    async def load_resume_token(self, name: str) -> Optional[Any]:
+        state = await self.db.change_stream_tokens.find_one({"_id": name})
+        return state["token"] if state else None
+
+    async def save_resume_token(self, name: str, token: Any):
+        await self.db.change_stream_tokens.update_one(
+            {"_id": name}, {"$set": {"token": token, "updated_at": datetime.utcnow()}}, upsert=True
+        )
+
+    async def apply_indexes(self, registry) -> List[dict]:
+        return await registry.apply(self.db)
+
+    def close(self):
+        self.client.close()
+
+
+class MemoryStorage(Storage):
+    """Process-local storage with no I/O, for benchmarks and tests.
+
+    Every operation completes without yielding to the event loop, so each one is
+    atomic just like the single-document updates the Mongo backend relies on.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.users: Dict[str, dict] = {}
+        self.user_ids: Dict[str, str] = {}
+        self.emails: Dict[str, str] = {}
+        self.items: Dict[str, dict] = {}
+        self.items_writes = 0
+        self.ledger: List[dict] = []
+        self.ledger_ids: Set[str] = set()
+        # Keyed by token hash; expired sessions are never removed here
+        self.sessions: Dict[str, dict] = {}
+
+    async def get_user_by_username(self, username: str) -> Optional[dict]:
+        user = self.users.get(username)
+        return copy.deepcopy(user) if user is not None else None
+
+    async def user_exists(self, username: str, email: str) -> bool:
+        return username in self.users or email in self.emails
+
+    async def insert_user(self, user: dict):
+        if user["username"] in self.users or user["email"] in self.emails or user["id"] in self.user_ids:
+            raise DuplicateError(user["username"])
+        self.users[user["username"]] = copy.deepcopy(user)
+        self.user_ids[user["id"]] = user["username"]
+        self.emails[user["email"]] = user["username"]
+
+    async def existing_users(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        return {name for name in usernames if name in self.users}, {email for email in emails if email in self.emails}
+
+    async def iter_users(self, after: Optional[str] = None, batch_size: int = 1000) -> AsyncIterator[Tuple[str, dict]]:
+        for user in sorted(self.users.values(), key=lambda user: user["id"]):
+            if after is None or user["id"] > after:
+                yield user["id"], {field: copy.deepcopy(user.get(field)) for field in EXPORT_FIELDS}
+
+    async def insert_users(self, users: List[dict]) -> dict:
+        result = {"inserted": 0, "duplicates": [], "errors": []}
+        for index, user in enumerate(users):
+            try:
+                await self.insert_user(user)
+                result["inserted"] += 1
+            except DuplicateError:
+                result["duplicates"].append(index)
+        return result
+
+    def _user_by_id(self, user_id: str) -> Optional[dict]:
+        username = self.user_ids.get(user_id)
+        return self.users.get(username) if username is not None else None
+
+    async def purchase(self, user_id: str, quantities: Mapping[str, int], total: int,
+                       name_to_id: Mapping[str, str]) -> Optional[dict]:
+        user = self._user_by_id(user_id)
+        if user is None or user["coins"] < total:
+            return None
+        if isinstance(user.get("inventory"), list):
+            user["inventory"] = count_inventory(user["inventory"], name_to_id)
+        user["coins"] -= total
+        for item_id, quantity in quantities.items():
+            user["inventory"][item_id] = user["inventory"].get(item_id, 0) + quantity
+        return copy.deepcopy(user)
+
+    async def change_balance(self, user_id: str, delta: int, min_balance: int) -> Optional[dict]:
+        user = self._user_by_id(user_id)
+        if user is None or user["coins"] < min_balance:
+            return None
+        user["coins"] += delta
+        return copy.deepcopy(user)
+
+    async def top_users(self, limit: int) -> List[dict]:
+        ranked = heapq.nsmallest(limit, self.users.values(), key=lambda user: (-user["coins"], user["username"]))
+        return [{"username": user["username"], "coins": user["coins"]} for user in ranked]
+
+    async def migrate_user_inventory(self, user: dict, name_to_id: Mapping[str, str]) -> dict:
+        if isinstance(user.get("inventory"), list):
+            counts = count_inventory(user["inventory"], name_to_id)
+            self.users[user["username"]]["inventory"] = counts
+            user = {**user, "inventory": copy.deepcopy(counts)}
+        return user
+
+    async def migrate_inventories(self, name_to_id: Mapping[str, str]) -> int:
+        migrated = 0
+        for user in self.users.values():
+            if isinstance(user.get("inventory"), list):
+                user["inventory"] = count_inventory(user["inventory"], name_to_id)
+                migrated += 1
+        return migrated
+
+    async def has_items(self) -> bool:
+        return bool(self.items)
+
+    async def upsert_items(self, items: List[Tuple[dict, dict]], key: str) -> dict:
+        ids = {existing[key]: item_id for item_id, existing in self.items.items()}
+        result = {"inserted": 0, "updated": 0, "unchanged": 0, "errors": []}
+        for fields, defaults in items:
+            item_id = ids.get(fields[key])
+            if item_id is None:
+                item = copy.deepcopy({**defaults, **fields})
+                self.items[item["id"]] = item
+                ids[item[key]] = item["id"]
+                result["inserted"] += 1
+                continue
+            updated = {**self.items[item_id], **copy.deepcopy(fields)}
+            if updated == self.items[item_id]:
+                result["unchanged"] += 1
+            else:
+                self.items[item_id] = updated
+                result["updated"] += 1
+        if result["inserted"] or result["updated"]:
+            self.items_writes += 1
+        return result
+
+    async def iter_items(self) -> AsyncIterator[dict]:
+        for item in list(self.items.values()):
+            yield copy.deepcopy(item)
+
+    async def items_version(self) -> Any:
+        return (self.items_writes, len(self.items))
+
+    async def append_ledger(self, entries: List[dict]):
+        for entry in entries:
+            if entry["id"] not in self.ledger_ids:
+                self.ledger_ids.add(entry["id"])
+                self.ledger.append(entry)
+
+    async def insert_session(self, session: dict):
+        self.sessions[session["token_hash"]] = copy.deepcopy(session)
+
+    async def claim_session(self, token_hash: str, now: datetime) -> Optional[dict]:
+        session = self.sessions.get(token_hash)
+        if session is None or session["rotated_at"] or session["revoked_at"] or session["expires_at"] <= now:
+            return None
+        session["rotated_at"] = now
+        return copy.deepcopy(session)
+
+    async def find_session(self, token_hash: str) -> Optional[dict]:
+        session = self.sessions.get(token_hash)
+        return copy.deepcopy(session) if session is not None else None
+
+    async def revoke_sessions(self, now: datetime, family_id: Optional[str] = None,
+                              user_id: Optional[str] = None) -> int:
+        revoked = 0
+        for session in self.sessions.values():
+            owner = session["family_id"] == family_id if family_id is not None else session["user_id"] == user_id
+            if owner and session["revoked_at"] is None:
+                session["revoked_at"] = now
+                revoked += 1
+        return revoked
+
+    async def apply_indexes(self, registry) -> List[dict]:
+        return registry.skip("memory storage has no indexes")
+
+
+def create_storage(env: Mapping[str, str], **client_options) -> Storage:
+    """Build the backend named by ``STORAGE_BACKEND`` (``mongo`` by default, or ``memory``)."""
+    backend = env.get("STORAGE_BACKEND", "mongo")
+    if backend == "mongo":
+        return MongoStorage(env["MONGO_URL"], env["DB_NAME"], **client_options)
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
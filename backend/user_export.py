@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "parquet")
+
+
+def export_row(user: dict) -> dict:
+    inventory = user.get("inventory") or {}
+    if isinstance(inventory, list):
+        # Not migrated to counts yet; keyed by item name instead of id
+        inventory = dict(Counter(inventory))
+    return {
+        "id": user.get("id"),
+        "username": user.get("username"),
+        "coins": user.get("coins"),
+        "inventory": inventory,
+        "inventory_items": sum(inventory.values()),
+        "created_at": user.get("created_at"),
+    }
+
+
+class NdjsonExport:
+    """Appends rows to one NDJSON file; a checkpoint is the byte length after an fsync."""
+
+    def __init__(self, path: Path, state: dict):
+        self.path = path
+        self.file = open(path, "r+b" if state.get("bytes") else "wb")
+        # Drop anything written after the last checkpoint of an interrupted run
+        self.file.truncate(state.get("bytes", 0))
+        self.file.seek(state.get("bytes", 0))
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            if isinstance(row["created_at"], datetime):
+                row["created_at"] = row["created_at"].isoformat()
+            self.file.write(json.dumps(row, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    def checkpoint(self) -> dict:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"bytes": self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetExport:
+    """Writes every chunk as its own Parquet part file in ``directory``.
+
+    Parts are written to a temporary name and renamed when complete, so a directory
+    only ever holds whole parts; a checkpoint is the number of parts written.
+    """
+
+    def __init__(self, directory: Path, state: dict):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("username", pa.string()),
+            ("coins", pa.int64()),
+            ("inventory", pa.map_(pa.string(), pa.int64())),
+            ("inventory_items", pa.int64()),
+            ("created_at", pa.timestamp("us")),
+        ])
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.parts = state.get("parts", 0)
+        for stale in self.directory.glob("*.parquet.tmp"):
+            stale.unlink()
+        for part in self.directory.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            row["inventory"] = list(row["inventory"].items())
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        final = self.directory / f"part-{self.parts:05d}.parquet"
+        temporary = final.with_name(final.name + ".tmp")
+        self.pq.write_table(table, temporary, compression="zstd")
+        os.replace(temporary, final)
+        self.parts += 1
+
+    def checkpoint(self) -> dict:
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def state_path(output: Path, fmt: str) -> Path:
+    return output / "_state.json" if fmt == "parquet" else output.with_name(output.name + ".state.json")
+
+
+def load_state(path: Path, fmt: str) -> Optional[dict]:
+    if not path.exists():
+        return None
+    state = json.loads(path.read_text())
+    if state.get("format") != fmt or state.get("completed"):
+        return None
+    return state
+
+
+def save_state(path: Path, state: dict):
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(json.dumps(state, indent=2))
+    os.replace(temporary, path)
+
+
+async def export_users(storage, output: Path, fmt: str = "ndjson", resume: bool = True, chunk_rows: int = 50000,
+                       batch_size: int = 1000, rows_per_second: Optional[float] = None,
+                       on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """Stream every user to ``output`` in chunks of ``chunk_rows``, checkpointing after each chunk.
+
+    Memory is bounded by one chunk. The checkpoint records the last exported resume
+    key (the ``_id``) together with the writer's position, so with ``resume`` an
+    interrupted export continues after the last complete chunk instead of starting
+    over. ``rows_per_second`` throttles the export to spare the serving database.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "parquet":
+        output.mkdir(parents=True, exist_ok=True)
+    state_file = state_path(output, fmt)
+    state = load_state(state_file, fmt) if resume else None
+    if state is not None:
+        logger.info("Resuming export to %s after %s (%d rows written)", output, state["after"], state["rows"])
+    else:
+        state = {"format": fmt, "after": None, "rows": 0, "started_at": datetime.utcnow().isoformat(), "completed": False}
+
+    writer = ParquetExport(output, state) if fmt == "parquet" else NdjsonExport(output, state)
+    started = time.perf_counter()
+    exported = 0
+    chunk: List[dict] = []
+    last_key = state["after"]
+
+    async def flush():
+        nonlocal exported
+        if not chunk:
+            return
+        writer.write(chunk)
+        exported += len(chunk)
+        state.update(writer.checkpoint(), after=last_key, rows=state["rows"] + len(chunk))
+        chunk.clear()
+        save_state(state_file, state)
+        if on_progress is not None:
+            on_progress(state)
+        if rows_per_second:
+            ahead = exported / rows_per_second - (time.perf_counter() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+    try:
+        async for key, user in storage.iter_users(state["after"], batch_size):
+            chunk.append(export_row(user))
+            last_key = key
+            if len(chunk) >= chunk_rows:
+                await flush()
+        await flush()
+    finally:
+        writer.close()
+
+    state.update(completed=True, finished_at=datetime.utcnow().isoformat())
+    save_state(state_file, state)
+    elapsed = time.perf_counter() - started
+    logger.info("Exported %d users to %s in %.1fs", exported, output, elapsed)
+    return {**state, "exported": exported, "seconds": round(elapsed, 3)}
@@ -0,0 +1,94 @@
+import logging
+import re
+from typing import AsyncIterable, Awaitable, Callable, List, Optional, Tuple, Union
+
+from catalog_import import ImportReport, describe_error
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_HASH = re.compile(r"^\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+def check_credentials(user: dict):
+    """Rows carry either a plaintext ``password`` or a bcrypt ``password_hash``, never both."""
+    password, password_hash = user.get("password"), user.get("password_hash")
+    if (password is None) == (password_hash is None):
+        raise ValueError("Give exactly one of password or password_hash")
+    if password_hash is not None and not BCRYPT_HASH.match(password_hash):
+        raise ValueError("password_hash is not a bcrypt hash")
+
+
+async def provision_users(rows: AsyncIterable[Tuple[int, Union[dict, Exception]]], storage,
+                          validate: Callable[[dict], dict], make_user: Callable[[dict], dict],
+                          hash_many: Callable[[List[str]], Awaitable[List[str]]], chunk_size: int = 1000,
+                          report: Optional[ImportReport] = None,
+                          on_progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+    """Create accounts from ``rows`` in chunks of ``chunk_size``.
+
+    Each chunk is checked for taken usernames and emails in one query (and against
+    itself), so duplicates are skipped before any bcrypt work is spent on them.
+    Plaintext passwords are hashed with ``hash_many`` and the chunk is written with
+    one unordered ``insert_many``. Duplicates are counted, not treated as errors, so
+    an interrupted import can simply be run again.
+    """
+    report = report or ImportReport()
+    chunk: List[Tuple[int, dict]] = []
+
+    async def flush():
+        if not chunk:
+            return
+        lines = list(chunk)
+        chunk.clear()
+
+        taken_usernames, taken_emails = await storage.existing_users(
+            [user["username"] for _, user in lines], [user["email"] for _, user in lines]
+        )
+        fresh = []
+        for line, user in lines:
+            if user["username"] in taken_usernames or user["email"] in taken_emails:
+                report.duplicates += 1
+                continue
+            taken_usernames.add(user["username"])
+            taken_emails.add(user["email"])
+            fresh.append((line, user))
+
+        plaintext = [user for _, user in fresh if user.get("password") is not None]
+        hashes = await hash_many([user["password"] for user in plaintext])
+        for user, password_hash in zip(plaintext, hashes):
+            user["password_hash"] = password_hash
+
+        documents = []
+        for _, user in fresh:
+            fields = {name: value for name, value in user.items() if name != "password" and value is not None}
+            documents.append(make_user(fields))
+        result = await storage.insert_users(documents)
+        report.inserted += result["inserted"]
+        report.duplicates += len(result["duplicates"])
+        for index, message in result["errors"]:
+            report.failed += 1
+            report.error(fresh[index][0], message)
+        if on_progress is not None:
+            on_progress(report)
+
+    async for line, row in rows:
+        report.rows += 1
+        if isinstance(row, Exception):
+            report.invalid += 1
+            report.error(line, describe_error(row))
+            continue
+        try:
+            user = validate(row)
+            check_credentials(user)
+        except ValueError as e:
+            report.invalid += 1
+            report.error(line, describe_error(e))
+            continue
+        chunk.append((line, user))
+        if len(chunk) >= chunk_size:
+            await flush()
+    await flush()
+    logger.info(
+        "Provisioned %d rows: %d inserted, %d duplicates, %d invalid, %d failed",
+        report.rows, report.inserted, report.duplicates, report.invalid, report.failed,
+    )
+    return report
@@ -0,0 +1,303 @@
+"""Concurrent load generator and latency benchmark for the GameHub API.
+
+Unlike backend_test.py, which checks behaviour one request at a time against a
+deployed URL, this drives a mix of traffic at a target concurrency against a
+local server and reports throughput and tail latency as JSON.
+
+    python backend_benchmark.py run --target asgi --concurrency 64 --duration 20
+    python backend_benchmark.py run --target uvicorn --storage mongo --output after.json
+    python backend_benchmark.py compare before.json after.json
+
+The game rate limits are switched off for asgi and uvicorn targets, since every
+virtual client shares one IP and a handful of users; pass --rate-limits to measure
+the limiter itself. 429 responses are reported as rate_limited, apart from the
+other 4xx rejections.
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import typer
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+DEFAULT_MIX = "register=1,login=1,me=4,items=8,purchase=2,lucky-spin=4,egg-smash=4"
+
+cli = typer.Typer(help=__doc__)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - set(OPERATIONS)
+    if unknown:
+        raise typer.BadParameter(f"Unknown operations in mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def random_name(rng: random.Random) -> str:
+    return "bench_" + "".join(rng.choices(string.ascii_lowercase + string.digits, k=12))
+
+
+class Session:
+    """A benchmark user: credentials plus the token obtained for them."""
+
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self.token: Optional[str] = None
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def register(client: httpx.AsyncClient, rng: random.Random, state: dict) -> httpx.Response:
+    username = random_name(rng)
+    return await client.post("/api/auth/register", json={
+        "username": username, "email": f"{username}@bench.local", "password": "benchmark-password",
+    })
+
+async def login(client, rng, state):
+    session = rng.choice(state["sessions"])
+    return await client.post("/api/auth/login", json={"username": session.username, "password": session.password})
+
+async def me(client, rng, state):
+    return await client.get("/api/auth/me", headers=rng.choice(state["sessions"]).headers)
+
+async def items(client, rng, state):
+    return await client.get("/api/items")
+
+async def purchase(client, rng, state):
+    item = rng.choice(state["items"])
+    return await client.post("/api/purchase", json={"item_id": item["id"]}, headers=rng.choice(state["sessions"]).headers)
+
+async def lucky_spin(client, rng, state):
+    return await client.post("/api/games/lucky-spin", headers=rng.choice(state["sessions"]).headers)
+
+async def egg_smash(client, rng, state):
+    return await client.post("/api/games/egg-smash", headers=rng.choice(state["sessions"]).headers)
+
+OPERATIONS = {
+    "register": register,
+    "login": login,
+    "me": me,
+    "items": items,
+    "purchase": purchase,
+    "lucky-spin": lucky_spin,
+    "egg-smash": egg_smash,
+}
+
+
+async def create_sessions(client: httpx.AsyncClient, count: int, rng: random.Random) -> List[Session]:
+    sessions = []
+    for _ in range(count):
+        session = Session(random_name(rng), "benchmark-password")
+        response = await client.post("/api/auth/register", json={
+            "username": session.username, "email": f"{session.username}@bench.local", "password": session.password,
+        })
+        response.raise_for_status()
+        session.token = response.json()["access_token"]
+        sessions.append(session)
+    return sessions
+
+
+async def worker(client, rng, state, weights, deadline, samples):
+    names = list(weights)
+    cumulative = list(np.cumsum([weights[name] for name in names]))
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, cum_weights=cumulative)[0]
+        started = time.perf_counter()
+        try:
+            response = await OPERATIONS[name](client, rng, state)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        samples[name].append((time.perf_counter() - started, status))
+
+
+def summarize(latencies: List[tuple], elapsed: float) -> dict:
+    seconds = np.array([latency for latency, _ in latencies]) if latencies else np.zeros(0)
+    statuses = [status for _, status in latencies]
+    errors = sum(1 for status in statuses if status == 0 or status >= 500)
+    rate_limited = sum(1 for status in statuses if status == 429)
+    # Other 4xx here are business rejections (insufficient coins, duplicate names), not failures
+    rejected = sum(1 for status in statuses if 400 <= status < 500 and status != 429)
+    summary = {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "errors": errors,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "rejected": rejected,
+        "rate_limited": rate_limited,
+    }
+    if len(seconds):
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+        summary.update({
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(seconds.max() * 1000), 3),
+        })
+    return summary
+
+
+async def run_load(base_url: str, transport, concurrency: int, duration: float, warmup: float,
+                   users: int, weights: Dict[str, float], seed: int) -> dict:
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, transport=transport, limits=limits, timeout=30) as client:
+        state = {
+            "sessions": await create_sessions(client, users, rng),
+            "items": (await client.get("/api/items")).json(),
+        }
+
+        if warmup > 0:
+            discard = {name: [] for name in OPERATIONS}
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*[
+                worker(client, random.Random(rng.random()), state, weights, deadline, discard)
+                for _ in range(concurrency)
+            ])
+
+        samples = {name: [] for name in OPERATIONS}
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            worker(client, random.Random(rng.random()), state, weights, deadline, samples)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    everything = [sample for name in samples for sample in samples[name]]
+    return {
+        "overall": summarize(everything, elapsed),
+        "routes": {name: summarize(samples[name], elapsed) for name in weights},
+        "elapsed_seconds": elapsed,
+    }
+
+
+async def run_asgi(storage: str, rate_limits: bool, **options) -> dict:
+    os.environ["STORAGE_BACKEND"] = storage
+    os.environ["RATE_LIMITING_ENABLED"] = str(rate_limits).lower()
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        return await run_load("http://benchmark", transport, **options)
+    finally:
+        await server.app.router.shutdown()
+
+
+def start_uvicorn(storage: str, port: int, workers: int, rate_limits: bool) -> subprocess.Popen:
+    env = {**os.environ, "STORAGE_BACKEND": storage, "RATE_LIMITING_ENABLED": str(rate_limits).lower()}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/items", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not become ready in 30 seconds")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@cli.command()
+def run(
+    target: str = typer.Option("asgi", help="asgi (in-process), uvicorn (local subprocess) or url"),
+    url: str = typer.Option("http://127.0.0.1:8001", help="Base URL when --target url"),
+    storage: str = typer.Option("memory", help="STORAGE_BACKEND for asgi/uvicorn targets"),
+    concurrency: int = typer.Option(32, help="Concurrent virtual clients"),
+    duration: float = typer.Option(10.0, help="Measured seconds"),
+    warmup: float = typer.Option(2.0, help="Unmeasured warm-up seconds"),
+    users: int = typer.Option(50, help="Accounts registered before the run"),
+    mix: str = typer.Option(DEFAULT_MIX, help="Comma-separated operation=weight pairs"),
+    port: int = typer.Option(8765, help="Port for the uvicorn target"),
+    workers: int = typer.Option(1, help="uvicorn workers for the uvicorn target"),
+    seed: int = typer.Option(1234, help="Seed for the traffic generator"),
+    rate_limits: bool = typer.Option(False, help="Keep the game rate limits on for asgi/uvicorn targets"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here as well as stdout"),
+):
+    """Drive a traffic mix at fixed concurrency and report RPS and latency percentiles."""
+    weights = parse_mix(mix)
+    options = dict(concurrency=concurrency, duration=duration, warmup=warmup, users=users, weights=weights, seed=seed)
+
+    if target == "asgi":
+        results = asyncio.run(run_asgi(storage, rate_limits, **options))
+    elif target == "uvicorn":
+        if storage == "memory" and workers > 1:
+            raise typer.BadParameter("memory storage is per process; use --storage mongo with several workers")
+        process = start_uvicorn(storage, port, workers, rate_limits)
+        try:
+            results = asyncio.run(run_load(f"http://127.0.0.1:{port}", None, **options))
+        finally:
+            process.terminate()
+            process.wait()
+    elif target == "url":
+        results = asyncio.run(run_load(url, None, **options))
+    else:
+        raise typer.BadParameter(f"Unknown target: {target}")
+
+    report = {
+        "revision": git_revision(),
+        "config": {
+            "target": target,
+            "storage": storage if target != "url" else None,
+            "rate_limits": rate_limits if target != "url" else None,
+            **options,
+        },
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    typer.echo(text)
+
+
+@cli.command()
+def compare(before: Path, after: Path):
+    """Show per-route RPS and p99 changes between two reports."""
+    old, new = json.loads(before.read_text()), json.loads(after.read_text())
+    if old["config"] != new["config"]:
+        typer.echo("warning: reports were produced with different configs", err=True)
+    typer.echo(f"{'route':<12}{'rps':>12}{'Δrps':>9}{'p99 ms':>10}{'Δp99':>9}")
+    for route in ["overall", *new["routes"]]:
+        a = old["overall"] if route == "overall" else old["routes"].get(route)
+        b = new["overall"] if route == "overall" else new["routes"][route]
+        if not a or "p99_ms" not in a or "p99_ms" not in b:
+            continue
+        rps_change = (b["rps"] - a["rps"]) / a["rps"] * 100 if a["rps"] else 0.0
+        p99_change = (b["p99_ms"] - a["p99_ms"]) / a["p99_ms"] * 100 if a["p99_ms"] else 0.0
+        typer.echo(f"{route:<12}{b['rps']:>12.1f}{rps_change:>8.1f}%{b['p99_ms']:>10.2f}{p99_change:>8.1f}%")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,70 @@
+"""Export users and balances for reporting, streaming from the database in flat memory.
+
+Reads id, username, coins, inventory and created_at (never emails or password
+hashes) from a cursor in _id order, preferring a secondary, and writes NDJSON or a
+directory of Parquet part files. Progress is checkpointed after every chunk, so an
+interrupted export picks up where it stopped when run again with the same output.
+
+    python backend_export.py users users.ndjson
+    python backend_export.py users exports/users-2024-06-01 --format parquet --chunk-rows 200000
+    python backend_export.py users users.ndjson --rows-per-second 20000 --no-resume
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+cli = typer.Typer(help=__doc__)
+
+
+@cli.callback()
+def main():
+    pass
+
+
+async def run_export(output: Path, fmt: str, **options) -> dict:
+    from dotenv import load_dotenv
+    from storage import create_storage
+    from user_export import export_users
+
+    load_dotenv(BACKEND_DIR / ".env")
+    storage = create_storage(os.environ)
+
+    def progress(state: dict):
+        typer.echo(f"{state['rows']} users exported, last _id {state['after']}", err=True)
+
+    try:
+        return await export_users(storage, output, fmt, on_progress=progress, **options)
+    finally:
+        storage.close()
+
+
+@cli.command()
+def users(
+    output: Path = typer.Argument(..., help="NDJSON file, or directory for Parquet parts"),
+    format: Optional[str] = typer.Option(None, help="ndjson or parquet; guessed from the output name by default"),
+    resume: bool = typer.Option(True, help="Continue an interrupted export to the same output"),
+    chunk_rows: int = typer.Option(50000, help="Rows per checkpoint (and per Parquet part)"),
+    batch_size: int = typer.Option(1000, help="Cursor batch size"),
+    rows_per_second: Optional[float] = typer.Option(None, help="Throttle to spare the serving database"),
+):
+    """Stream every user's balance and inventory to NDJSON or Parquet."""
+    if format is None:
+        format = "ndjson" if output.suffix in (".ndjson", ".jsonl", ".json") else "parquet"
+    if format not in ("ndjson", "parquet"):
+        raise typer.BadParameter(f"Unknown format: {format}")
+    report = asyncio.run(run_export(
+        output, format, resume=resume, chunk_rows=chunk_rows, batch_size=batch_size, rows_per_second=rows_per_second,
+    ))
+    typer.echo(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    cli()
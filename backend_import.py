@@ -0,0 +1,148 @@
+"""Stream NDJSON or CSV files of catalog items or user accounts into the database.
+
+Catalog rows are validated against the Item model and upserted in chunks with unordered
+bulk writes, so files of any size import in flat memory. Items are matched on
+item_name by default, which keeps the ids existing inventories refer to; use
+--key id when the file carries authoritative ids. Running servers pick up the new
+catalog through their change streams (or at their next TTL resync).
+
+    python backend_import.py items catalog.ndjson
+    python backend_import.py items catalog.csv --chunk-size 5000 --output report.json
+    gunzip -c catalog.ndjson.gz | python backend_import.py items - --format ndjson
+
+User rows need username and email plus either password (hashed here with bcrypt
+across a process pool) or password_hash (an existing bcrypt hash, stored as is);
+coins, id and created_at are optional. Usernames or emails that are already
+taken are counted as duplicates and skipped, so an interrupted run can be
+repeated.
+
+    python backend_import.py users legacy-players.ndjson --workers 16
+
+The same pipelines are served to admins at POST /api/admin/items/import and
+POST /api/admin/users/import.
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+cli = typer.Typer(help=__doc__)
+
+
+@cli.callback()
+def main():
+    pass
+
+
+async def run_import(path: str, fmt: str, key: str, chunk_size: int, max_errors: int) -> dict:
+    import server
+    from catalog_import import ImportReport, aiter_sync, import_items, parse_rows
+
+    def progress(report: ImportReport):
+        typer.echo(
+            f"{report.rows} rows: {report.inserted} inserted, {report.updated} updated, "
+            f"{report.unchanged} unchanged, {report.invalid + report.failed} errors",
+            err=True,
+        )
+
+    await server.storage.apply_indexes(server.index_registry)
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        report = await import_items(
+            parse_rows(aiter_sync(source), fmt), server.storage, server.validate_item,
+            key=key, chunk_size=chunk_size, report=ImportReport(max_errors), on_progress=progress,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        server.storage.close()
+        server.log_listener.stop()
+    return report.dict()
+
+
+async def run_provisioning(path: str, fmt: str, chunk_size: int, max_errors: int, workers: int) -> dict:
+    import server
+    from catalog_import import ImportReport, aiter_sync, parse_rows
+    from password_pool import PasswordPool
+    from user_import import provision_users
+
+    def progress(report: ImportReport):
+        typer.echo(
+            f"{report.rows} rows: {report.inserted} inserted, {report.duplicates} duplicates, "
+            f"{report.invalid + report.failed} errors",
+            err=True,
+        )
+
+    await server.storage.apply_indexes(server.index_registry)
+    pool = PasswordPool(kind="process", max_workers=workers, max_queue=workers)
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8-sig", newline="")
+    try:
+        report = await provision_users(
+            parse_rows(aiter_sync(source), fmt), server.storage, server.validate_provisioned_user, server.make_user,
+            pool.hash_many, chunk_size=chunk_size, report=ImportReport(max_errors), on_progress=progress,
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        pool.shutdown()
+        server.storage.close()
+        server.log_listener.stop()
+    return report.dict()
+
+
+def guess_format(path: str, format: Optional[str]) -> str:
+    if format is None:
+        format = "csv" if path.lower().endswith(".csv") else "ndjson"
+    if format not in ("ndjson", "csv"):
+        raise typer.BadParameter(f"Unknown format: {format}")
+    return format
+
+
+def finish(report: dict, output: Optional[Path]):
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    typer.echo(text)
+    if report["invalid"] or report["failed"]:
+        raise typer.Exit(1)
+
+
+@cli.command()
+def items(
+    path: str = typer.Argument(..., help="NDJSON or CSV file, or - for stdin"),
+    format: Optional[str] = typer.Option(None, help="ndjson or csv; guessed from the file extension by default"),
+    key: str = typer.Option("item_name", help="Field items are matched on: item_name or id"),
+    chunk_size: int = typer.Option(1000, help="Rows per bulk write"),
+    max_errors: int = typer.Option(1000, help="Row errors to keep in the report"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here as well as stdout"),
+):
+    """Validate and upsert a catalog file."""
+    format = guess_format(path, format)
+    if key not in ("item_name", "id"):
+        raise typer.BadParameter(f"Unknown key: {key}")
+    finish(asyncio.run(run_import(path, format, key, chunk_size, max_errors)), output)
+
+
+@cli.command()
+def users(
+    path: str = typer.Argument(..., help="NDJSON or CSV file, or - for stdin"),
+    format: Optional[str] = typer.Option(None, help="ndjson or csv; guessed from the file extension by default"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="bcrypt worker processes"),
+    chunk_size: int = typer.Option(1000, help="Rows per duplicate check and insert_many"),
+    max_errors: int = typer.Option(1000, help="Row errors to keep in the report"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here as well as stdout"),
+):
+    """Create user accounts in bulk."""
+    format = guess_format(path, format)
+    finish(asyncio.run(run_provisioning(path, format, chunk_size, max_errors, workers)), output)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,209 @@
+"""Monte Carlo return-to-player simulator for the GameHub payout tables.
+
+Loads the same game registry the /api/games endpoints draw from (or an override
+file with candidate tables) and simulates plays in vectorized chunks across a
+process pool. Reports RTP with a confidence interval, the per-play variance, and
+what happens to a balance over a session of plays: ruin probability and
+percentiles of the final balance.
+
+    python backend_simulate.py run --plays 200000000
+    python backend_simulate.py run --game egg-smash --sessions 100000 --session-plays 1000
+    python backend_simulate.py run --override candidate.json --output candidate-report.json
+    python backend_simulate.py tables
+
+An override file maps game slugs to ``{"cost": int, "payouts": [{"coins", "probability"}]}``;
+either key may be omitted to keep the current value.
+"""
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import typer
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from games import AliasSampler, game_registry, validate_payouts  # noqa: E402
+
+PERCENTILES = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+
+cli = typer.Typer(help=__doc__)
+
+# (coins, probabilities) of one payout table, as plain tuples so tasks pickle cheaply
+Table = Tuple[Tuple[int, ...], Tuple[float, ...]]
+
+_samplers: Dict[Table, AliasSampler] = {}
+
+
+def table_sampler(table: Table) -> AliasSampler:
+    """Build each table's alias sampler once per worker process."""
+    sampler = _samplers.get(table)
+    if sampler is None:
+        sampler = _samplers[table] = AliasSampler(list(table[1]))
+    return sampler
+
+
+def count_outcomes(table: Table, seed: np.random.SeedSequence, plays: int) -> np.ndarray:
+    """Simulate ``plays`` draws and return how often each payout came up."""
+    rng = np.random.default_rng(seed)
+    return np.bincount(table_sampler(table).sample(rng, plays), minlength=len(table[0]))
+
+
+def play_sessions(table: Table, cost: int, seed: np.random.SeedSequence, sessions: int, plays: int,
+                  balance: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Play ``sessions`` independent sessions of up to ``plays`` plays from ``balance`` coins.
+
+    A session stops early (ruin) once the balance can no longer cover the cost of a
+    play, exactly like the endpoints refuse the play. Returns final balances and the
+    number of plays each session completed.
+    """
+    rng = np.random.default_rng(seed)
+    coins = np.asarray(table[0], dtype=np.int64)
+    outcomes = table_sampler(table).sample(rng, sessions * plays).reshape(sessions, plays)
+    balances = balance + np.cumsum(coins[outcomes] - cost, axis=1)
+    # Balance before each play; the first play that cannot be afforded ends the session
+    before = np.concatenate((np.full((sessions, 1), balance, dtype=np.int64), balances[:, :-1]), axis=1)
+    broke = before < cost
+    ruined = broke.any(axis=1)
+    completed = np.where(ruined, broke.argmax(axis=1), plays)
+    final = np.where(ruined, before[np.arange(sessions), np.minimum(completed, plays - 1)], balances[:, -1])
+    return final, completed
+
+
+def split(total: int, chunk: int) -> List[int]:
+    return [chunk] * (total // chunk) + ([total % chunk] if total % chunk else [])
+
+
+def load_games(slugs: List[str], override: Optional[Path]) -> Dict[str, dict]:
+    overrides = json.loads(override.read_text()) if override else {}
+    unknown = set(overrides) - {game.slug for game in game_registry}
+    if unknown:
+        raise typer.BadParameter(f"Override names unknown games: {', '.join(sorted(unknown))}")
+    games = {}
+    for game in game_registry:
+        if slugs and game.slug not in slugs:
+            continue
+        cost = overrides.get(game.slug, {}).get("cost", game.cost)
+        payouts = overrides.get(game.slug, {}).get("payouts", game.payouts)
+        try:
+            validate_payouts(game.slug, cost, payouts)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+        games[game.slug] = {"cost": cost, "payouts": payouts, "overridden": game.slug in overrides}
+    missing = set(slugs) - set(games)
+    if missing:
+        raise typer.BadParameter(f"Unknown games: {', '.join(sorted(missing))}")
+    return games
+
+
+def theoretical(cost: int, payouts: List[dict]) -> dict:
+    mean = math.fsum(p["coins"] * p["probability"] for p in payouts)
+    second = math.fsum(p["coins"] ** 2 * p["probability"] for p in payouts)
+    return {"rtp": mean / cost, "net_per_play": mean - cost, "variance_per_play": second - mean ** 2}
+
+
+def simulate_rtp(pool: ProcessPoolExecutor, table: Table, cost: int, plays: int, chunk: int,
+                 seed: np.random.SeedSequence) -> dict:
+    sizes = split(plays, chunk)
+    seeds = seed.spawn(len(sizes))
+    counts = sum(pool.map(count_outcomes, [table] * len(sizes), seeds, sizes))
+    coins = np.asarray(table[0], dtype=np.float64)
+    mean = float(counts @ coins) / plays
+    variance = float(counts @ (coins - mean) ** 2) / plays
+    standard_error = math.sqrt(variance / plays) / cost
+    return {
+        "plays": plays,
+        "rtp": mean / cost,
+        "rtp_ci95": [mean / cost - 1.96 * standard_error, mean / cost + 1.96 * standard_error],
+        "net_per_play": mean - cost,
+        "variance_per_play": variance,
+        "stddev_per_play": math.sqrt(variance),
+        "outcome_frequencies": {str(int(c)): int(n) / plays for c, n in zip(table[0], counts)},
+    }
+
+
+def simulate_sessions(pool: ProcessPoolExecutor, table: Table, cost: int, sessions: int, plays: int,
+                      balance: int, chunk: int, seed: np.random.SeedSequence) -> dict:
+    sizes = split(sessions, max(1, chunk // plays))
+    seeds = seed.spawn(len(sizes))
+    results = list(pool.map(
+        play_sessions, [table] * len(sizes), [cost] * len(sizes), seeds, sizes,
+        [plays] * len(sizes), [balance] * len(sizes),
+    ))
+    final = np.concatenate([result[0] for result in results])
+    completed = np.concatenate([result[1] for result in results])
+    return {
+        "sessions": sessions,
+        "plays_per_session": plays,
+        "starting_balance": balance,
+        "ruin_probability": float(np.mean(completed < plays)),
+        "mean_plays_completed": float(completed.mean()),
+        "mean_final_balance": float(final.mean()),
+        "final_balance_percentiles": {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(final, PERCENTILES))},
+    }
+
+
+@cli.command()
+def run(
+    game: List[str] = typer.Option([], help="Games to simulate (repeatable); all by default"),
+    plays: int = typer.Option(100_000_000, help="Independent plays for the RTP estimate"),
+    sessions: int = typer.Option(100_000, help="Simulated sessions for ruin and balance percentiles"),
+    session_plays: int = typer.Option(1000, help="Plays per session"),
+    balance: int = typer.Option(1000, help="Starting balance of each session (the signup bonus)"),
+    chunk: int = typer.Option(4_000_000, help="Draws per vectorized task"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes"),
+    seed: int = typer.Option(1234, help="Root seed; results do not depend on --workers"),
+    override: Optional[Path] = typer.Option(None, help="JSON file with candidate cost/payout tables"),
+    output: Optional[Path] = typer.Option(None, help="Write the JSON report here as well as stdout"),
+):
+    """Estimate RTP, variance, ruin probability and balance percentiles per game."""
+    games = load_games(game, override)
+    root = np.random.SeedSequence(seed)
+    report = {"config": {"plays": plays, "sessions": sessions, "session_plays": session_plays,
+                         "balance": balance, "chunk": chunk, "workers": workers, "seed": seed,
+                         "override": str(override) if override else None},
+              "games": {}}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (slug, spec), game_seed in zip(games.items(), root.spawn(len(games))):
+            table: Table = (tuple(p["coins"] for p in spec["payouts"]), tuple(p["probability"] for p in spec["payouts"]))
+            rtp_seed, session_seed = game_seed.spawn(2)
+            started = time.perf_counter()
+            result = {"cost": spec["cost"], "overridden": spec["overridden"],
+                      "theoretical": theoretical(spec["cost"], spec["payouts"])}
+            if plays:
+                result["simulated"] = simulate_rtp(pool, table, spec["cost"], plays, chunk, rtp_seed)
+            if sessions and session_plays:
+                result["session"] = simulate_sessions(
+                    pool, table, spec["cost"], sessions, session_plays, balance, chunk, session_seed
+                )
+            elapsed = time.perf_counter() - started
+            result["seconds"] = elapsed
+            result["plays_per_second"] = (plays + sessions * session_plays) / elapsed if elapsed else None
+            report["games"][slug] = result
+
+    text = json.dumps(report, indent=2)
+    if output:
+        output.write_text(text)
+    typer.echo(text)
+
+
+@cli.command()
+def tables(override: Optional[Path] = typer.Option(None, help="JSON file with candidate cost/payout tables")):
+    """Print each payout table with its exact RTP and variance."""
+    for slug, spec in load_games([], override).items():
+        exact = theoretical(spec["cost"], spec["payouts"])
+        typer.echo(f"{slug}  cost {spec['cost']}  RTP {exact['rtp']:.4f}  "
+                   f"net/play {exact['net_per_play']:+.2f}  stddev/play {math.sqrt(exact['variance_per_play']):.2f}")
+        for payout in spec["payouts"]:
+            typer.echo(f"  {payout['coins']:>6} coins  p={payout['probability']:.4f}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -5,6 +5,58 @@ import './App.css';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Renew an expired access token with the refresh token and retry the request once.
+// A refresh token is single use, and presenting it twice revokes the whole session,
+// so concurrent 401s share one refresh and tabs take turns through a Web Lock. A tab
+// that waited for the lock picks up the token another tab stored meanwhile.
+let refreshing = null;
+
+// Fired in this tab when a refresh stores a new access token (other tabs see a storage event)
+const TOKEN_CHANGED = 'gamehub:token';
+
+const refreshAccessToken = (staleToken) => {
+  if (!refreshing) {
+    const refresh = async () => {
+      const current = localStorage.getItem('token');
+      if (current && current !== staleToken) {
+        return current;
+      }
+      const response = await axios.post(
+        `${API}/auth/refresh`,
+        { refresh_token: localStorage.getItem('refresh_token') },
+        { timeout: 10000 }
+      );
+      localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refresh_token', response.data.refresh_token);
+      localStorage.setItem('user', JSON.stringify(response.data.user));
+      window.dispatchEvent(new Event(TOKEN_CHANGED));
+      return response.data.access_token;
+    };
+    refreshing = (navigator.locks ? navigator.locks.request('gamehub-refresh', refresh) : refresh()).finally(() => {
+      refreshing = null;
+    });
+  }
+  return refreshing;
+};
+
+axios.interceptors.response.use(undefined, async (error) => {
+  const config = error.config;
+  if (
+    error.response?.status !== 401 ||
+    !config ||
+    config._retried ||
+    config.url.includes('/auth/') ||
+    !localStorage.getItem('refresh_token')
+  ) {
+    throw error;
+  }
+  config._retried = true;
+  const staleToken = (config.headers?.Authorization || '').replace('Bearer ', '');
+  const token = await refreshAccessToken(staleToken);
+  config.headers.Authorization = `Bearer ${token}`;
+  return axios(config);
+});
+
 // Authentication Component
 const AuthForm = ({ onLogin }) => {
   const [isLogin, setIsLogin] = useState(true);
@@ -39,6 +91,7 @@ const AuthForm = ({ onLogin }) => {
       
       if (response.data.access_token && response.data.user) {
         localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
         localStorage.setItem('user', JSON.stringify(response.data.user));
         onLogin(response.data.user);
       } else {
@@ -133,27 +186,78 @@ const AuthForm = ({ onLogin }) => {
 const Dashboard = ({ user, onLogout }) => {
   const [activeTab, setActiveTab] = useState('webshop');
   const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [userCoins, setUserCoins] = useState(user.coins);
   const [inventory, setInventory] = useState(user.inventory);
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState('');
+  const [accessToken, setAccessToken] = useState(localStorage.getItem('token'));
 
   useEffect(() => {
     loadItems();
   }, []);
 
+  useEffect(() => {
+    // Follow token refreshes made by this tab or another one
+    const syncToken = (event) => {
+      if (!event.key || event.key === 'token') {
+        setAccessToken(localStorage.getItem('token'));
+      }
+    };
+    window.addEventListener('storage', syncToken);
+    window.addEventListener(TOKEN_CHANGED, syncToken);
+    return () => {
+      window.removeEventListener('storage', syncToken);
+      window.removeEventListener(TOKEN_CHANGED, syncToken);
+    };
+  }, []);
+
+  useEffect(() => {
+    // Balance changes made from other tabs or devices arrive over server-sent events.
+    // The stream is reopened whenever the access token changes.
+    const source = new EventSource(`${API}/events?token=${encodeURIComponent(accessToken)}`);
+    let retry = null;
+    const applyBalance = (event) => {
+      const data = JSON.parse(event.data);
+      setUserCoins(data.coins);
+      if (data.inventory) {
+        setInventory(data.inventory);
+      }
+    };
+    source.addEventListener('snapshot', applyBalance);
+    source.addEventListener('balance', applyBalance);
+    source.onerror = () => {
+      // Network errors reconnect on their own; an HTTP error such as a 401 for an
+      // expired token closes the stream, so refresh the token and reopen it
+      if (source.readyState !== EventSource.CLOSED) {
+        return;
+      }
+      retry = setTimeout(() => {
+        refreshAccessToken(accessToken)
+          .then(setAccessToken)
+          .catch((err) => console.error('Error refreshing token for push updates:', err));
+      }, 1000);
+    };
+    return () => {
+      clearTimeout(retry);
+      source.close();
+    };
+  }, [accessToken]);
+
   const getAuthHeaders = () => ({
     Authorization: `Bearer ${localStorage.getItem('token')}`
   });
 
-  const loadItems = async () => {
+  const loadItems = async (cursor = null) => {
     try {
       console.log('Loading items from API...');
       const response = await axios.get(`${API}/items`, {
+        params: cursor ? { cursor } : {},
         timeout: 10000
       });
       console.log('Items loaded:', response.data.length);
-      setItems(response.data);
+      setItems(cursor ? [...items, ...response.data] : response.data);
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       console.error('Failed to load items:', err);
       setMessage('Failed to load items from server');
@@ -176,10 +280,7 @@ const Dashboard = ({ user, onLogout }) => {
       
       console.log('Purchase response:', response.data);
       setUserCoins(response.data.coins_remaining);
-      const item = items.find(i => i.id === itemId);
-      if (item) {
-        setInventory([...inventory, item.item_name]);
-      }
+      setInventory(response.data.inventory);
       setMessage(response.data.message);
       setTimeout(() => setMessage(''), 3000);
     } catch (err) {
@@ -201,7 +302,7 @@ const Dashboard = ({ user, onLogout }) => {
         { headers: getAuthHeaders() }
       );
       
-      setUserCoins(userCoins - 50 + response.data.coins_won);
+      setUserCoins(response.data.balance);
       setMessage(response.data.message);
       setTimeout(() => setMessage(''), 3000);
     } catch (err) {
@@ -221,7 +322,7 @@ const Dashboard = ({ user, onLogout }) => {
         { headers: getAuthHeaders() }
       );
       
-      setUserCoins(userCoins - 25 + response.data.coins_won);
+      setUserCoins(response.data.balance);
       setMessage(response.data.message);
       setTimeout(() => setMessage(''), 3000);
     } catch (err) {
@@ -259,6 +360,16 @@ const Dashboard = ({ user, onLogout }) => {
           </div>
         ))}
       </div>
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={() => loadItems(nextCursor)}
+            className="px-6 py-2 bg-white/10 text-white rounded-lg hover:bg-white/20 transition-all"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 
@@ -402,6 +513,7 @@ function App() {
       } catch (err) {
         console.error('Error parsing user data:', err);
         localStorage.removeItem('token');
+        localStorage.removeItem('refresh_token');
         localStorage.removeItem('user');
       }
     }
@@ -413,7 +525,14 @@ function App() {
   };
 
   const handleLogout = () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axios.post(`${API}/auth/logout`, { refresh_token: refreshToken }).catch((err) => {
+        console.error('Error revoking session:', err);
+      });
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
     setUser(null);
   };
@@ -0,0 +1,54 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Set before server is imported; load_dotenv does not override variables that are already set
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["CHANGE_STREAMS_ENABLED"] = "false"
+os.environ["RATE_LIMITING_ENABLED"] = "false"
+os.environ["ADMIN_USERNAMES"] = "admin"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+
+@pytest.fixture(scope="session")
+def server():
+    import server
+
+    return server
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def account(client):
+    """A freshly registered user: the register response plus ready-made auth headers."""
+    username = f"player_{uuid.uuid4().hex[:12]}"
+    response = client.post(
+        "/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "secret"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    data["headers"] = {"Authorization": f"Bearer {data['access_token']}"}
+    return data
+
+
+@pytest.fixture
+def set_coins(server):
+    def set_coins(account: dict, coins: int):
+        username = account["user"]["username"]
+        server.storage.users[username]["coins"] = coins
+        server.principal_cache.invalidate_user(username)
+
+    return set_coins
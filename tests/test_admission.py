@@ -0,0 +1,18 @@
+def test_shed_requests_never_read_the_user(client, server, account, monkeypatch):
+    reads = []
+
+    async def get_user_by_username(username):
+        reads.append(username)
+        return None
+
+    server.principal_cache.users.clear()
+    monkeypatch.setattr(server.storage, "get_user_by_username", get_user_by_username)
+    monkeypatch.setattr(server.mongo_pool_listener, "current_wait_seconds", lambda: 10.0)
+    response = client.post("/api/games/egg-smash", headers=account["headers"])
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+    assert reads == []
+
+
+def test_game_requests_need_a_token(client):
+    assert client.post("/api/games/egg-smash").status_code in (401, 403)
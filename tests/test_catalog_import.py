@@ -0,0 +1,99 @@
+import asyncio
+
+from catalog_import import ImportReport, aiter_sync, import_items, iter_documents, parse_rows
+from storage import MemoryStorage
+
+SWORD = {
+    "id": "sword",
+    "item_type": "Weapon",
+    "item_name": "Steel Sword",
+    "coin_price": 150,
+    "description": "A sharp steel sword",
+    "image_url": "https://example.com/sword.png",
+}
+
+
+def run_import(storage, rows, server, fmt="ndjson", key="item_name", chunk_size=1000):
+    async def run():
+        return await import_items(
+            parse_rows(aiter_sync(rows), fmt), storage, server.validate_item, key=key, chunk_size=chunk_size
+        )
+
+    return asyncio.run(run())
+
+
+def seeded_storage(server):
+    storage = MemoryStorage()
+    asyncio.run(import_items(iter_documents([dict(SWORD)]), storage, server.validate_item))
+    return storage
+
+
+def test_partial_row_keeps_columns_it_leaves_out(server):
+    storage = seeded_storage(server)
+    report = run_import(storage, [
+        '{"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 175, "description": "price bump"}\n',
+    ], server)
+    assert (report.updated, report.inserted) == (1, 0)
+    assert storage.items["sword"] == {**SWORD, "coin_price": 175, "description": "price bump"}
+
+
+def test_empty_csv_cells_keep_stored_values_and_default_new_items(server):
+    storage = seeded_storage(server)
+    report = run_import(storage, [
+        "item_type,item_name,coin_price,description,image_url\n",
+        "Weapon,Steel Sword,160,Resharpened,\n",
+        "Potion,Health Potion,20,Heals,\n",
+    ], server, fmt="csv")
+    assert (report.updated, report.inserted, report.invalid) == (1, 1, 0)
+    assert storage.items["sword"]["image_url"] == SWORD["image_url"]
+    potion = next(item for item in storage.items.values() if item["item_name"] == "Health Potion")
+    assert potion["image_url"] == ""
+    assert potion["id"]
+
+
+def test_rows_for_the_same_key_merge_within_a_chunk(server):
+    storage = seeded_storage(server)
+    run_import(storage, [
+        '{"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 175, "description": "first"}\n',
+        '{"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 180, "description": "second",'
+        ' "image_url": "https://example.com/new.png"}\n',
+        '{"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 190, "description": "third"}\n',
+    ], server)
+    assert storage.items["sword"] == {
+        **SWORD, "coin_price": 190, "description": "third", "image_url": "https://example.com/new.png",
+    }
+
+
+def test_existing_ids_survive_name_keyed_imports(server):
+    storage = seeded_storage(server)
+    run_import(storage, [
+        '{"id": "other", "item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 1, "description": "x"}\n',
+    ], server)
+    assert set(storage.items) == {"sword"}
+    assert storage.items["sword"]["coin_price"] == 1
+
+
+def test_reimport_is_unchanged_and_invalid_rows_are_reported(server):
+    storage = seeded_storage(server)
+    rows = [
+        '{"item_type": "Weapon", "item_name": "Steel Sword", "coin_price": 150, "description": "A sharp steel sword"}\n',
+        '{"item_type": "Weapon", "item_name": "Broken", "coin_price": "lots", "description": "x"}\n',
+        'not json\n',
+    ]
+    report = run_import(storage, rows, server)
+    assert isinstance(report, ImportReport)
+    assert (report.unchanged, report.invalid) == (1, 2)
+    assert [error["line"] for error in report.dict()["errors"]] == [2, 3]
+
+
+def test_ids_that_are_not_field_names_are_rejected(server):
+    storage = seeded_storage(server)
+    rows = [
+        '{"id": "sword.v2", "item_type": "Weapon", "item_name": "Sword 2", "coin_price": 1, "description": "x"}\n',
+        '{"id": "$bad", "item_type": "Weapon", "item_name": "Sword 3", "coin_price": 1, "description": "x"}\n',
+        '{"id": "ok", "item_type": "Weapon", "item_name": "Sword 4", "coin_price": 1, "description": "x"}\n',
+    ]
+    report = run_import(storage, rows, server)
+    assert (report.inserted, report.invalid) == (1, 2)
+    assert [error["line"] for error in report.dict()["errors"]] == [1, 2]
+    assert set(storage.items) == {"sword", "ok"}
@@ -0,0 +1,129 @@
+import json
+import random
+
+import pytest
+
+from catalog import SORTS, CatalogSnapshot, decode_cursor, encode_cursor
+
+
+def make_items(count=60, seed=5):
+    rng = random.Random(seed)
+    # Few distinct prices, so every sort order has to break ties
+    return [
+        {
+            "id": f"item-{rng.getrandbits(32):08x}",
+            "item_type": rng.choice(["Weapon", "Armor", "Potion"]),
+            "item_name": f"Item {number}",
+            "coin_price": rng.choice([10, 25, 25, 50, 100]),
+            "description": "",
+            "image_url": "",
+        }
+        for number in range(count)
+    ]
+
+
+def expected_order(items, sort, item_type=None, min_price=None, max_price=None):
+    matching = [
+        (position, item) for position, item in enumerate(items)
+        if (item_type is None or item["item_type"] == item_type)
+        and (min_price is None or item["coin_price"] >= min_price)
+        and (max_price is None or item["coin_price"] <= max_price)
+    ]
+    if sort == "price_asc":
+        matching.sort(key=lambda pair: (pair[1]["coin_price"], pair[1]["id"]))
+    elif sort == "price_desc":
+        matching.sort(key=lambda pair: (-pair[1]["coin_price"], pair[1]["id"]))
+    return [item["id"] for _, item in matching]
+
+
+def collect(snapshot, limit, **filters):
+    seen, after, totals = [], None, set()
+    while True:
+        page = snapshot.page(after=after, limit=limit, **filters)
+        assert len(page.items) <= limit
+        seen.extend(item["id"] for item in page.items)
+        totals.add(page.total)
+        if page.next_key is None:
+            return seen, totals
+        # Go through the wire format, as clients do
+        after = decode_cursor(encode_cursor(filters["sort"], page.next_key), filters["sort"])
+
+
+@pytest.mark.parametrize("sort", SORTS)
+@pytest.mark.parametrize("limit", [1, 7, 60, 200])
+@pytest.mark.parametrize("filters", [
+    {},
+    {"item_type": "Weapon"},
+    {"min_price": 25},
+    {"max_price": 25},
+    {"item_type": "Armor", "min_price": 25, "max_price": 50},
+    {"min_price": 60, "max_price": 70},
+])
+def test_paging_matches_brute_force(sort, limit, filters):
+    items = make_items()
+    snapshot = CatalogSnapshot(1, items)
+    if sort == "catalog" and ("min_price" in filters or "max_price" in filters):
+        # No price index in catalog order, so no linear scans either
+        with pytest.raises(ValueError):
+            snapshot.page(sort=sort, limit=limit, **filters)
+        return
+    seen, totals = collect(snapshot, limit, sort=sort, **filters)
+    expected = expected_order(items, sort, **filters)
+    assert seen == expected
+    assert totals == {len(expected)}
+
+
+def test_catalog_order_resumes_after_the_cursor_item_when_items_move():
+    items = make_items(10)
+    first = CatalogSnapshot(1, items).page(sort="catalog", limit=4)
+    # An item before the cursor is removed before the next page is fetched
+    moved = CatalogSnapshot(2, items[1:])
+    rest = moved.page(sort="catalog", after=first.next_key, limit=100)
+    assert [item["id"] for item in rest.items] == [item["id"] for item in items[4:]]
+
+
+def test_cursor_round_trip_and_rejection():
+    key = (25, "item-1")
+    assert decode_cursor(encode_cursor("price_asc", key), "price_asc") == key
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("price_asc", key), "price_desc")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor", "catalog")
+
+
+def test_api_pages_with_headers_and_rejects_bad_cursors(client):
+    total = len(client.get("/api/items", params={"limit": 200}).json())
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "sort": "price_desc", **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/items", params=params)
+        assert response.status_code == 200
+        assert int(response.headers["X-Total-Count"]) == total
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == total
+
+    assert client.get("/api/items", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/items", params={"min_price": 10}).status_code == 400
+    assert client.get("/api/items", params={"min_price": 10, "sort": "price_asc"}).status_code == 200
+    other_sort = encode_cursor("price_asc", (10, "x"))
+    assert client.get("/api/items", params={"cursor": other_sort, "sort": "price_desc"}).status_code == 400
+
+
+def test_unknown_item_type_is_an_empty_page_and_builds_no_views():
+    snapshot = CatalogSnapshot(1, make_items())
+    views = dict(snapshot._views)
+    page = snapshot.page(item_type="Nonexistent", min_price=10, sort="price_asc")
+    assert (page.items, page.next_key, page.total) == ([], None, 0)
+    assert snapshot._views == views
+
+
+def test_page_body_is_the_json_of_its_items():
+    snapshot = CatalogSnapshot(1, make_items())
+    page = snapshot.page(item_type="Potion", sort="price_desc", limit=5)
+    assert json.loads(page.body) == page.items
+    assert json.loads(snapshot.page(item_type="Nonexistent").body) == []
+    assert CatalogSnapshot(2, make_items()).etag == snapshot.etag
+    assert CatalogSnapshot(3, make_items(seed=6)).etag != snapshot.etag
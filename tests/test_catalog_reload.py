@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from catalog import ItemCatalog
+from catalog_import import import_items, iter_documents
+from invalidation import RESYNC, ChangeEvent
+
+
+@pytest.fixture
+def loads(server, monkeypatch):
+    calls = []
+    load = server.item_catalog.load
+
+    async def counting_load(documents, source_version=None):
+        calls.append(source_version)
+        return await load(documents, source_version)
+
+    monkeypatch.setattr(server.item_catalog, "load", counting_load)
+    return calls
+
+
+def reload(client, server, forced=False):
+    server.app.state.catalog_stale = True
+    server.app.state.catalog_forced = forced
+    client.portal.call(server.reload_catalog)
+
+
+def test_reload_is_skipped_until_the_items_fingerprint_moves(client, server, loads):
+    reload(client, server)
+    assert loads == []
+
+    item = dict(next(iter(server.storage.items.values())))
+    client.portal.call(import_items, iter_documents([item]), server.storage, server.validate_item)
+    reload(client, server)
+    assert loads == []
+
+    client.portal.call(
+        import_items, iter_documents([{**item, "coin_price": item["coin_price"] + 1}]), server.storage, server.validate_item
+    )
+    reload(client, server)
+    assert len(loads) == 1
+    assert server.item_catalog.get(item["id"])["coin_price"] == item["coin_price"] + 1
+
+
+def test_change_events_skip_items_the_catalog_already_holds(client, server, loads):
+    item = dict(server.item_catalog.snapshot.items[0])
+
+    async def dispatch(event):
+        server.app.state.catalog_stale = server.app.state.catalog_forced = False
+        server.on_items_changed(event)
+        if not server.app.state.catalog_stale:
+            return False
+        await server.app.state.catalog_reload
+        return True
+
+    assert client.portal.call(dispatch, ChangeEvent("items", "update", "x", {"_id": "x", **item})) is False
+    assert loads == []
+    # Fingerprint unchanged, so a resync does not reload
+    client.portal.call(dispatch, ChangeEvent("items", RESYNC))
+    assert loads == []
+    # An out-of-band edit leaves the fingerprint alone but is still picked up
+    client.portal.call(dispatch, ChangeEvent("items", "update", "x", {**item, "description": "edited"}))
+    assert len(loads) == 1
+
+
+def test_load_records_the_source_version():
+    async def run():
+        catalog = ItemCatalog()
+
+        async def documents():
+            yield {"id": "a", "item_type": "Weapon", "item_name": "A", "coin_price": 1, "description": ""}
+
+        await catalog.load(documents(), (1, 1))
+        return catalog
+
+    catalog = asyncio.run(run())
+    assert catalog.source_version == (1, 1)
+    assert catalog.get("a")["coin_price"] == 1
@@ -0,0 +1,28 @@
+def first_item(client):
+    return client.get("/api/items", params={"limit": 1}).json()[0]
+
+
+def checkout(client, account, item_id, quantity=1):
+    return client.post(
+        "/api/checkout", json={"items": [{"item_id": item_id, "quantity": quantity}]}, headers=account["headers"],
+    )
+
+
+def test_checkout_uses_the_stored_balance_not_the_cached_one(client, server, account):
+    item = first_item(client)
+    # Warm the principal cache, then credit coins behind its back
+    client.get("/api/auth/me", headers=account["headers"])
+    username = account["user"]["username"]
+    server.storage.users[username]["coins"] = item["coin_price"] * 20
+    assert server.principal_cache.get_user(username).coins < item["coin_price"] * 20
+
+    response = checkout(client, account, item["id"], 20)
+    assert response.status_code == 200
+    assert server.storage.users[username]["coins"] == 0
+
+
+def test_checkout_is_rejected_when_the_stored_balance_is_short(client, server, account, set_coins):
+    item = first_item(client)
+    set_coins(account, item["coin_price"] - 1)
+    assert checkout(client, account, item["id"]).status_code == 400
+    assert server.storage.users[account["user"]["username"]]["coins"] == item["coin_price"] - 1
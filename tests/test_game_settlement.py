@@ -0,0 +1,41 @@
+import pytest
+
+from games import game_registry
+
+GAMES = [game.slug for game in game_registry]
+
+
+@pytest.mark.parametrize("slug", GAMES)
+def test_batch_is_rejected_when_balance_does_not_cover_every_play(client, server, account, set_coins, slug):
+    game = game_registry.get(slug)
+    count = 4
+    balance = game.cost * count - 1
+    # Winnings must not count towards the stake, whatever the draw
+    for _ in range(50):
+        set_coins(account, balance)
+        response = client.post(f"/api/games/{slug}", params={"count": count}, headers=account["headers"])
+        assert response.status_code == 400
+    assert server.storage.users[account["user"]["username"]]["coins"] == balance
+
+
+@pytest.mark.parametrize("slug", GAMES)
+def test_batch_settles_net_result_when_balance_covers_every_play(client, server, account, set_coins, slug):
+    game = game_registry.get(slug)
+    count = 5
+    set_coins(account, game.cost * count)
+    response = client.post(f"/api/games/{slug}", params={"count": count}, headers=account["headers"])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["plays"] == count
+    assert len(data["results"]) == count
+    assert data["coins_won"] == sum(data["results"])
+    assert data["net_gain"] == data["coins_won"] - game.cost * count
+    assert data["balance"] == game.cost * count + data["net_gain"]
+    assert server.storage.users[account["user"]["username"]]["coins"] == data["balance"]
+
+
+def test_batch_count_is_bounded(client, account, server):
+    response = client.post(
+        f"/api/games/{GAMES[0]}", params={"count": server.GAME_MAX_BATCH + 1}, headers=account["headers"]
+    )
+    assert response.status_code == 422
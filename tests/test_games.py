@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from games import AliasSampler, Game, GameRegistry, game_registry, validate_payouts
+
+
+def make_game(slug="coin-flip", cost=10, payouts=None):
+    return Game(
+        slug=slug,
+        cost=cost,
+        payouts=payouts or [{"coins": 0, "probability": 0.5}, {"coins": 20, "probability": 0.5}],
+        message="You won {coins_won} coins!",
+        batch_message="You played {count} times and won {coins_won} coins!",
+    )
+
+
+@pytest.mark.parametrize("probabilities", [
+    [0.3, 0.25, 0.2, 0.15, 0.08, 0.02],
+    [0.4, 0.3, 0.15, 0.1, 0.04, 0.01],
+    [0.999, 0.001],
+    [0.25, 0.25, 0.25, 0.25],
+])
+def test_alias_sampler_matches_distribution(probabilities):
+    draws = 400_000
+    samples = AliasSampler(probabilities).sample(np.random.default_rng(7), draws)
+    observed = np.bincount(samples, minlength=len(probabilities)) / draws
+    expected = np.array(probabilities)
+    # Five standard errors per outcome
+    tolerance = 5 * np.sqrt(expected * (1 - expected) / draws)
+    assert np.all(np.abs(observed - expected) <= tolerance)
+
+
+def test_alias_sampler_never_draws_impossible_outcomes():
+    samples = AliasSampler([0.5, 0.0, 0.5, 0.0]).sample(np.random.default_rng(1), 100_000)
+    assert set(np.unique(samples)) == {0, 2}
+
+
+def test_alias_sampler_single_outcome():
+    samples = AliasSampler([1.0]).sample(np.random.default_rng(1), 1000)
+    assert np.all(samples == 0)
+
+
+def test_game_draw_returns_payout_coins():
+    game = make_game()
+    results = game.draw(np.random.default_rng(3), 1000)
+    assert results.shape == (1000,)
+    assert set(np.unique(results)) <= {0, 20}
+    assert game.expected_return() == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("cost, payouts, message", [
+    (0, [{"coins": 1, "probability": 1.0}], "cost must be positive"),
+    (10, [], "payout table is empty"),
+    (10, [{"coins": -1, "probability": 1.0}], "payouts cannot be negative"),
+    (10, [{"coins": 1, "probability": 1.5}, {"coins": 2, "probability": -0.5}], "between 0 and 1"),
+    (10, [{"coins": 1, "probability": 0.5}, {"coins": 2, "probability": 0.4}], "sum to"),
+])
+def test_validate_payouts_rejects_bad_tables(cost, payouts, message):
+    with pytest.raises(ValueError, match=message):
+        validate_payouts("broken", cost, payouts)
+
+
+def test_registry_rejects_duplicate_slugs():
+    registry = GameRegistry()
+    registry.register(make_game())
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register(make_game())
+    assert registry.get("coin-flip") is not None
+    assert registry.get("missing") is None
+
+
+def test_registered_games_are_routed(client, account):
+    for game in game_registry:
+        response = client.post(f"/api/games/{game.slug}", headers=account["headers"])
+        assert response.status_code == 200, game.slug
+        assert response.json()["plays"] == 1
@@ -0,0 +1,53 @@
+import asyncio
+
+from ledger import LedgerWriter
+from storage import MemoryStorage
+
+
+def test_retrying_an_applied_batch_does_not_duplicate_entries():
+    storage = MemoryStorage()
+    attempts = []
+
+    async def write_batch(entries):
+        # The write lands, but the acknowledgement is lost (e.g. a timeout)
+        await storage.append_ledger(entries)
+        attempts.append(len(entries))
+        if len(attempts) == 1:
+            raise TimeoutError("write timed out")
+
+    async def run():
+        ledger = LedgerWriter(write_batch, batch_size=10, flush_interval=0.01)
+        ledger.start()
+        for number in range(5):
+            await ledger.record("user-1", "player", "game", "egg-smash", -10, 100 - 10 * number)
+        await ledger.drain()
+        return ledger.stats()
+
+    stats = asyncio.run(run())
+    assert len(attempts) == 2
+    assert stats["written"] == 5 and stats["dropped"] == 0
+    assert len(storage.ledger) == 5
+    assert len({entry["id"] for entry in storage.ledger}) == 5
+
+
+def test_append_ledger_skips_stored_ids():
+    storage = MemoryStorage()
+    entries = [{"id": str(number), "delta": number} for number in range(3)]
+    asyncio.run(storage.append_ledger(entries[:2]))
+    asyncio.run(storage.append_ledger(entries))
+    assert [entry["id"] for entry in storage.ledger] == ["0", "1", "2"]
+
+
+def test_batches_are_dropped_after_the_last_retry():
+    async def write_batch(entries):
+        raise ConnectionError("down")
+
+    async def run():
+        ledger = LedgerWriter(write_batch, batch_size=10, flush_interval=0.01, max_retries=2)
+        ledger.start()
+        await ledger.record("user-1", "player", "purchase", "sword", -150, 850)
+        await ledger.drain()
+        return ledger.stats()
+
+    stats = asyncio.run(run())
+    assert stats["dropped"] == 1 and stats["written"] == 0
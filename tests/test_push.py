@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+
+from push import PushHub
+from request_log import RedactQueryTokens
+
+
+async def read_all(stream):
+    return [frame async for frame in stream]
+
+
+def test_stream_ends_when_the_token_expires():
+    async def run():
+        hub = PushHub()
+        stream = hub.stream("user-1", {"coins": 1}, heartbeat=0.01, expires_at=time.time() + 0.05)
+        frames = await asyncio.wait_for(read_all(stream), 1)
+        return hub, frames
+
+    hub, frames = asyncio.run(run())
+    assert frames[0].startswith(b"event: snapshot")
+    assert not hub.subscribed("user-1")
+
+
+def test_disconnect_ends_open_streams():
+    async def run():
+        hub = PushHub()
+        reader = asyncio.create_task(read_all(hub.stream("user-1", {"coins": 1}, heartbeat=10)))
+        await asyncio.sleep(0)
+        hub.publish("user-1", "balance", {"coins": 2})
+        hub.disconnect("user-1")
+        return await asyncio.wait_for(reader, 1)
+
+    frames = asyncio.run(run())
+    assert [frame.split(b"\n")[0] for frame in frames] == [b"event: snapshot", b"event: balance"]
+
+
+def test_access_log_redacts_query_tokens():
+    record = logging.LogRecord(
+        "uvicorn.access", logging.INFO, __file__, 0, '%s - "%s %s HTTP/%s" %d',
+        ("127.0.0.1:5000", "GET", "/api/events?token=abc.def.ghi&x=1", "1.1", 200), None,
+    )
+    RedactQueryTokens().filter(record)
+    assert record.getMessage() == '127.0.0.1:5000 - "GET /api/events?token=[redacted]&x=1 HTTP/1.1" 200'
@@ -0,0 +1,87 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from sessions import SessionInvalid, SessionManager, hash_refresh_token
+from storage import MemoryStorage
+
+
+def refresh(client, token):
+    return client.post("/api/auth/refresh", json={"refresh_token": token})
+
+
+def test_login_issues_a_refresh_token(client, account):
+    response = client.post("/api/auth/login", json={"username": account["user"]["username"], "password": "secret"})
+    data = response.json()
+    assert response.status_code == 200
+    assert data["refresh_token"] and data["refresh_token"] != account["refresh_token"]
+    assert data["expires_in"] > 0
+
+
+def test_refresh_rotates_and_returns_a_working_access_token(client, server, account):
+    response = refresh(client, account["refresh_token"])
+    assert response.status_code == 200
+    data = response.json()
+    assert data["refresh_token"] != account["refresh_token"]
+    assert data["user"]["username"] == account["user"]["username"]
+    me = client.get("/api/auth/me", headers={"Authorization": f"Bearer {data['access_token']}"})
+    assert me.status_code == 200
+
+    # Only hashes are stored
+    stored = server.storage.sessions
+    assert account["refresh_token"] not in stored
+    assert hash_refresh_token(data["refresh_token"]) in stored
+
+
+def test_reusing_a_rotated_token_revokes_the_family(client, account):
+    first = account["refresh_token"]
+    second = refresh(client, first).json()["refresh_token"]
+    third = refresh(client, second).json()["refresh_token"]
+
+    assert refresh(client, first).status_code == 401
+    # The legitimate holder is signed out too
+    assert refresh(client, third).status_code == 401
+
+
+def test_reuse_only_revokes_its_own_family(client, account):
+    other = client.post("/api/auth/login", json={"username": account["user"]["username"], "password": "secret"})
+    other_token = other.json()["refresh_token"]
+
+    rotated = refresh(client, account["refresh_token"]).json()["refresh_token"]
+    assert refresh(client, account["refresh_token"]).status_code == 401
+    assert refresh(client, rotated).status_code == 401
+    assert refresh(client, other_token).status_code == 200
+
+
+def test_unknown_tokens_are_rejected(client):
+    assert refresh(client, "not-a-token").status_code == 401
+
+
+def test_logout_revokes_only_that_device(client, account):
+    other = client.post("/api/auth/login", json={"username": account["user"]["username"], "password": "secret"})
+    response = client.post("/api/auth/logout", json={"refresh_token": account["refresh_token"]})
+    assert response.status_code == 200
+    assert refresh(client, account["refresh_token"]).status_code == 401
+    assert refresh(client, other.json()["refresh_token"]).status_code == 200
+
+
+def test_logout_all_revokes_every_session(client, account):
+    other = client.post("/api/auth/login", json={"username": account["user"]["username"], "password": "secret"})
+    response = client.post("/api/auth/logout-all", headers=account["headers"])
+    assert response.status_code == 200
+    assert response.json()["sessions_revoked"] == 2
+    assert refresh(client, account["refresh_token"]).status_code == 401
+    assert refresh(client, other.json()["refresh_token"]).status_code == 401
+
+
+def test_expired_sessions_cannot_be_rotated():
+    async def run():
+        manager = SessionManager(MemoryStorage(), lifetime=timedelta(seconds=-1))
+        token = await manager.issue("user-1", "player")
+        with pytest.raises(SessionInvalid):
+            await manager.rotate(token)
+        return manager.stats()
+
+    stats = asyncio.run(run())
+    assert stats["rejected"] == 1 and stats["reuse_detected"] == 0